@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """
+    A write handled by one worker has to invalidate the cache
+    versions and cached responses of all of them.
+    """
+    if settings.WEB_WORKERS <= 1:
+        return []
+    return [
+        Error(
+            f'Cache {alias!r} is private to every one of the '
+            f'{settings.WEB_WORKERS} workers, they would serve stale '
+            f'responses after writes made by the others.',
+            hint='Set CACHE_BACKEND to memcached or another shared '
+                 'backend, or run a single worker.',
+            obj=alias,
+            id='api.E001',
+        )
+        for alias, config in settings.CACHES.items()
+        if config['BACKEND'] in PROCESS_LOCAL_CACHES
+    ]
@@ -0,0 +1,80 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from .metrics import mark_view_done
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_THREADS', 16),
+    thread_name_prefix='orm'
+)
+
+
+def _call(func, *args, **kwargs):
+    # executor threads live past the request, drop broken or
+    # expired connections like request_started/finished do
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    Run blocking code, the ORM above all, on the bounded executor.
+    """
+    return await sync_to_async(
+        _call, thread_sensitive=False, executor=executor
+    )(func, *args, **kwargs)
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        mark_view_done(request)
+        response.render()
+        # Django would render a template response again through its
+        # one thread for sync code, hand it a plain response instead
+        plain = HttpResponse(
+            response.content, status=response.status_code,
+            reason=response.reason_phrase, headers=dict(response.items())
+        )
+        plain.cookies = response.cookies
+        response = plain
+    return response
+
+
+def async_view(view):
+    """
+    Async version of a sync view, reads are served from the
+    executor. Writes run on Django's thread for sync code, as they
+    would without the wrapper, and take no executor slots. Only
+    with ASYNC_VIEWS on, under WSGI it would need an event loop per
+    request.
+    """
+    if not getattr(settings, 'ASYNC_VIEWS', False):
+        return view
+    sync_view = sync_to_async(view, thread_sensitive=True)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await sync_view(request, *args, **kwargs)
+        return await run_sync(render_view, view, request, *args, **kwargs)
+    return wrapper
+
+
+def async_routes(patterns, names):
+    """
+    Swap the views of the named url patterns for async versions.
+    """
+    for pattern in patterns:
+        if getattr(pattern, 'name', None) in names:
+            pattern.callback = async_view(pattern.callback)
+    return patterns
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Prometheus style histogram with cumulative buckets per label set.
+    """
+    def __init__(self, name, description, buckets, labels):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [
+                [0] * (len(self.buckets) + 1), 0.0
+            ]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _label_text(self, values, **extra):
+        pairs = [*zip(self.labels, values), *extra.items()]
+        return ','.join(
+            f'{name}="{value}"' for name, value in pairs
+        )
+
+    def expose(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket'
+                       f'{{{self._label_text(values, le=bound)}}} '
+                       f'{cumulative}')
+            labels = self._label_text(values)
+            yield f'{self.name}_sum{{{labels}}} {total}'
+            yield f'{self.name}_count{{{labels}}} {cumulative}'
+
+
+class Registry:
+    """
+    In-process request metrics. Every worker process keeps its
+    own, so scrape each worker or run a single one behind them.
+    """
+    labels = ('route', 'method')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.duration = Histogram(
+            'http_request_duration_seconds', 'Wall time of requests',
+            DURATION_BUCKETS, self.labels
+        )
+        self.db_time = Histogram(
+            'http_request_db_seconds', 'SQL time spent per request',
+            DURATION_BUCKETS, self.labels
+        )
+        self.queries = Histogram(
+            'http_request_db_queries', 'SQL queries run per request',
+            QUERY_BUCKETS, self.labels
+        )
+        self.size = Histogram(
+            'http_response_size_bytes', 'Response body size',
+            SIZE_BUCKETS, self.labels
+        )
+        self.responses = {}
+
+    def observe(self, route, method, status, duration, queries, db_time,
+                size):
+        labels = (route, method)
+        with self._lock:
+            self.duration.observe(labels, duration)
+            self.queries.observe(labels, queries)
+            self.db_time.observe(labels, db_time)
+            if size is not None:
+                self.size.observe(labels, size)
+            key = (route, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def observe_size(self, route, method, size):
+        with self._lock:
+            self.size.observe((route, method), size)
+
+    def expose(self, extra=()):
+        with self._lock:
+            lines = [
+                '# HELP http_responses_total Responses by status',
+                '# TYPE http_responses_total counter',
+            ]
+            lines.extend(
+                f'http_responses_total{{route="{route}",'
+                f'method="{method}",status="{status}"}} {count}'
+                for (route, method, status), count
+                in sorted(self.responses.items())
+            )
+            for histogram in (self.duration, self.db_time, self.queries,
+                              self.size):
+                lines.extend(histogram.expose())
+        lines.extend(extra)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """
+    `execute_wrapper` counting queries and the time spent in them.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+request_timer = ContextVar('request_timer', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    timer = request_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # the timer of the request travels in a context variable, so
+    # queries run from executor threads under ASGI are counted too
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def mark_view_done(request):
+    request._metrics_view_done = time.perf_counter()
+
+
+def _count_streamed(content, route, method):
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    registry.observe_size(route, method, size)
+
+
+class MetricsMiddleware:
+    """
+    Record route, wall time, SQL queries and time, and response
+    size of every request. With METRICS_SERVER_TIMING on, the
+    split between database, view and rendering time is sent in a
+    `Server-Timing` header. Works in both sync and async chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING',
+                                     False)
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns
+        mark_view_done(request)
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        token = request_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_timer.reset(token)
+        return self.record(request, response, timer, start)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        token = request_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_timer.reset(token)
+        return self.record(request, response, timer, start)
+
+    def record(self, request, response, timer, start):
+        end = time.perf_counter()
+        match = request.resolver_match
+        route = 'unmatched'
+        if match:
+            route = match.url_name or match.view_name
+        if response.streaming:
+            size = None
+            response.streaming_content = _count_streamed(
+                response.streaming_content, route, request.method
+            )
+        else:
+            size = len(response.content)
+        registry.observe(
+            route, request.method, response.status_code, end - start,
+            timer.count, timer.duration, size
+        )
+        if self.server_timing:
+            view_done = getattr(request, '_metrics_view_done', end)
+            view = view_done - start - timer.duration
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={timer.duration * 1000:.1f};'
+                f'desc="{timer.count} queries"',
+                f'view;dur={view * 1000:.1f}',
+                f'render;dur={(end - view_done) * 1000:.1f}',
+                f'total;dur={(end - start) * 1000:.1f}',
+            ))
+        return response
@@ -0,0 +1,29 @@
+import threading
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .concurrency import async_view
+
+
+def thread_name(request):
+    return HttpResponse(threading.current_thread().name)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncViewTest(SimpleTestCase):
+    """
+    Only reads go through the bounded executor.
+    """
+    def call(self, method):
+        request = getattr(RequestFactory(), method)('/')
+        return async_to_sync(async_view(thread_name))(request).content
+
+    def test_reads_on_executor(self):
+        for method in ('get', 'head', 'options'):
+            self.assertTrue(self.call(method).startswith(b'orm'), method)
+
+    def test_writes_not_on_executor(self):
+        for method in ('post', 'put', 'patch', 'delete'):
+            self.assertFalse(self.call(method).startswith(b'orm'), method)
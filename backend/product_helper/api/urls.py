@@ -2,6 +2,12 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from recipes.views import IngredientsViewSet, TagViewSet, RecipeViewSet
+from .concurrency import async_routes
+from .views import MetricsView
+
+ASYNC_ROUTES = ('recipe-list', 'recipe-detail', 'recipe-feed',
+                'recipe-shopping-list', 'ingredients-list',
+                'ingredients-detail', 'tags-list', 'tags-detail')
 
 
 router_v1 = DefaultRouter()
@@ -10,5 +16,6 @@ router_v1.register('ingredients', IngredientsViewSet, basename='ingredients')
 router_v1.register('tags', TagViewSet, basename='tags')
 
 urlpatterns = [
-   path('', include(router_v1.urls)),
+   path('metrics/', MetricsView.as_view(), name='metrics'),
+   path('', include(async_routes(router_v1.urls, ASYNC_ROUTES))),
 ]
@@ -0,0 +1,45 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.permissions import BasePermission, IsAdminUser
+from rest_framework.views import APIView
+
+from users.authentication import token_cache
+from .metrics import registry
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Scrapers authenticate with `Authorization: Bearer <METRICS_TOKEN>`.
+    """
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and hmac.compare_digest(
+            header.encode(), f'Bearer {token}'.encode()
+        )
+
+
+def token_cache_metrics():
+    stats = token_cache.stats()
+    for name, kind in (('hits', 'counter'), ('shared_hits', 'counter'),
+                       ('misses', 'counter'), ('size', 'gauge')):
+        metric = f'auth_token_cache_{name}'
+        if kind == 'counter':
+            metric += '_total'
+        yield f'# TYPE {metric} {kind}'
+        yield f'{metric} {stats[name]}'
+
+
+class MetricsView(APIView):
+    """
+    Request metrics in Prometheus text format.
+    """
+    permission_classes = (IsAdminUser | HasMetricsToken,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.expose(token_cache_metrics()),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
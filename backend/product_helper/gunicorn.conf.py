@@ -0,0 +1,30 @@
+"""
+Gunicorn settings, picked up from the working directory.
+
+Sync WSGI workers serve one request at a time, uvicorn ASGI workers
+many, with blocking work on ASYNC_THREADS threads each.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', default='sync')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    default=multiprocessing.cpu_count() * (
+        1 if 'uvicorn' in worker_class else 2
+    ) + 1
+))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=60))
+# the Django checks see how many processes share the caches
+os.environ['GUNICORN_WORKERS'] = str(workers)
+
+
+def on_starting(server):
+    # refuse to start with caches private to every worker
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'product_helper.settings')
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command('check')
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,21 @@ DATABASES = {
     }
 }
 
+# cache versions, cached recipes and revoked tokens must be seen by
+# every worker, locmem only does for a single process
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.memcached.PyMemcacheCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='memcached:11211'),
+    }
+}
+
+# set by gunicorn.conf.py, checked against process-local caches
+WEB_WORKERS = int(os.getenv('GUNICORN_WORKERS', default=1))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,7 +121,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -127,6 +143,29 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+
+DATA_UPLOAD_MAX_MEMORY_SIZE = 8 * 1024 * 1024
+
+TOKEN_AUTH_CACHE_SIZE = 10000
+TOKEN_AUTH_CACHE_TTL = 30
+TOKEN_AUTH_SHARED_CACHE_TTL = int(
+    os.getenv('TOKEN_AUTH_SHARED_CACHE_TTL', default=0)
+) or None
+TOKEN_AUTH_REVOCATION_CHECK_INTERVAL = 1
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING') == 'True'
+
+# set by asgi.py, see README
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS') == 'True'
+ASYNC_THREADS = int(os.getenv('ASYNC_THREADS', default=16))
+
+# recipes of authors with more followers are read, not fanned out
+FEED_CELEBRITY_FOLLOWERS = 1000
+# recipes copied to a feed on follow
+FEED_BACKFILL = 50
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
-from .models import (Favorite, Ingredient, Recipes, RecipesIngredient,
-                     RecipesTag, Tag)
+from .models import Ingredient, Recipes, RecipesIngredient, RecipesTag, Tag
+from .shopping_list import ingredients_changed
 
 
 @admin.register(Recipes)
@@ -9,26 +9,72 @@ class RecipesAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'author',
                     'amount_favorites', 'amount_tags',
                     'amount_ingredients')
-    list_filter = ('author', 'name', 'tags')
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username', 'author__email')
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     empty_value_display = '-empty-'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related('tags', 'ingredients')
+
+    @admin.display(ordering='favorites_count')
     def amount_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     def amount_tags(self, obj):
-        return ([i[0] for i in obj.tags.values_list('name')])
+        return [tag.name for tag in obj.tags.all()]
 
     def amount_ingredients(self, obj):
-        return ([i[0] for i in obj.ingredients.values_list('name')])
+        return [ingredient.name for ingredient in obj.ingredients.all()]
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('name',)
     empty_value_display = '-empty-'
 
 
-admin.site.register(Tag)
-admin.site.register(RecipesTag)
-admin.site.register(RecipesIngredient)
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'color', 'slug')
+    search_fields = ('name', 'slug')
+
+
+@admin.register(RecipesTag)
+class RecipesTagAdmin(admin.ModelAdmin):
+    list_select_related = ('tag', 'recipe__author')
+    autocomplete_fields = ('recipe', 'tag')
+    show_full_result_count = False
+
+
+@admin.register(RecipesIngredient)
+class RecipesIngredientAdmin(admin.ModelAdmin):
+    list_select_related = ('ingredient', 'recipe__author')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
+
+    # edits reach the shopping lists of carts holding the recipe
+    @staticmethod
+    def _change_lists(item, sign):
+        ingredients_changed(item.recipe_id, {
+            item.ingredient_id: (sign * (item.amount or 0), sign)
+        })
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            self._change_lists(RecipesIngredient.objects.get(pk=obj.pk), -1)
+        super().save_model(request, obj, form, change)
+        self._change_lists(obj, 1)
+
+    def delete_model(self, request, obj):
+        self._change_lists(obj, -1)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for item in queryset:
+            self._change_lists(item, -1)
+        super().delete_queryset(request, queryset)
@@ -0,0 +1,110 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from .cache import get_version
+from .models import Ingredient
+
+
+def normalize(value):
+    """
+    Case-insensitive form of a name, `ё` is matched as `е`.
+    """
+    return unicodedata.normalize('NFKC', value).casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    In-memory autocomplete index over all ingredients.
+    Names are kept in a sorted array, prefix lookups are a binary
+    search. Exact matches go first, then prefix and substring matches.
+    The index is built lazily and rebuilt after `invalidate`, when
+    the shared `ingredients` cache version moves, so changes made
+    by other processes are seen on the next search, and at least
+    every `INGREDIENT_INDEX_TTL` seconds for writes that bypass it.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._keys = []
+        self._items = []
+        self._text = ''
+        self._offsets = []
+        self._built_at = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._built_at = None
+
+    def build(self, version=None):
+        if version is None:
+            version, _ = get_version('ingredients')
+        rows = Ingredient.objects.values('id', 'name', 'measurement_unit')
+        entries = sorted(
+            ((normalize(row['name']), row['id'], row) for row in rows),
+            key=lambda entry: entry[:2]
+        )
+        keys = [key for key, _, _ in entries]
+        offsets = []
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        with self._lock:
+            self._keys = keys
+            self._items = [item for _, _, item in entries]
+            self._text = '\n'.join(keys)
+            self._offsets = offsets
+            self._built_at = time.monotonic()
+            self._version = version
+
+    def _ensure_built(self):
+        # read before the rows, a change made during the build is
+        # picked up by the next search
+        version, _ = get_version('ingredients')
+        built_at = self._built_at
+        if (built_at is None or version != self._version
+                or time.monotonic() - built_at > self.ttl):
+            self.build(version)
+
+    def _substring_matches(self, query, keys, text, offsets):
+        if len(query) < 2:
+            # Most names contain a single letter, a plain scan is cheaper.
+            yield from (i for i, key in enumerate(keys) if query in key)
+            return
+        position = text.find(query)
+        while position != -1:
+            i = bisect_right(offsets, position) - 1
+            yield i
+            if i + 1 == len(offsets):
+                break
+            position = text.find(query, offsets[i + 1])
+
+    def search(self, query):
+        self._ensure_built()
+        query = normalize(query).replace('\n', '')
+        with self._lock:
+            keys, items = self._keys, self._items
+            text, offsets = self._text, self._offsets
+        if not query:
+            return list(items)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = items[start:end]
+        result.extend(
+            items[i] for i in self._substring_matches(
+                query, keys, text, offsets
+            )
+            if not start <= i < end
+        )
+        return result
+
+
+ingredient_index = IngredientIndex(
+    getattr(settings, 'INGREDIENT_INDEX_TTL', 300)
+)
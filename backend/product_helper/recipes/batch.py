@@ -0,0 +1,120 @@
+from django.db import connections, router
+from django.db.models import Exists, OuterRef
+
+from .models import Recipes
+from .relations import relations_changed
+
+ADDED = 'added'
+ALREADY_ADDED = 'already_added'
+REMOVED = 'removed'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+
+
+def check_recipes(user, model, recipe_ids):
+    """
+    Which of the recipes exist and which of those the user already
+    has in `model`, with one query.
+    """
+    return dict(Recipes.objects.filter(id__in=recipe_ids).annotate(
+        added=Exists(model.objects.filter(user=user, recipe=OuterRef('pk')))
+    ).values_list('id', 'added'))
+
+
+def returning(model, sql, params, **names):
+    connection = connections[router.db_for_write(model)]
+    names['table'] = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**{
+            key: connection.ops.quote_name(name)
+            for key, name in names.items()
+        }), params)
+        return {recipe_id for recipe_id, in cursor.fetchall()}
+
+
+def insert_relations(user, model, recipe_ids):
+    """
+    One INSERT ... ON CONFLICT DO NOTHING RETURNING (Postgres,
+    SQLite 3.35+). Unlike bulk_create(ignore_conflicts=True) it
+    tells which rows were inserted, rows a concurrent request
+    added first are not counted twice.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = [
+        field for field in model._meta.local_concrete_fields
+        if not field.primary_key
+    ]
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for obj in (
+            model(user=user, recipe_id=recipe_id) for recipe_id in recipe_ids
+        )
+        for field in fields
+    ]
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    return returning(
+        model,
+        'INSERT INTO {table} ('
+        + ', '.join(f'{{{field.name}}}' for field in fields)
+        + ') VALUES ' + ', '.join([row] * len(recipe_ids))
+        + ' ON CONFLICT DO NOTHING RETURNING {recipe}',
+        params,
+        **{field.name: field.column for field in fields}
+    )
+
+
+def delete_relations(user, model, recipe_ids):
+    """
+    One DELETE ... RETURNING, without loading the rows and sending
+    signals for each of them as QuerySet.delete() would, the
+    caller runs `relations_changed` for the deleted rows at once.
+    """
+    return returning(
+        model,
+        'DELETE FROM {table} WHERE {user} = %s AND {recipe} IN ('
+        + ', '.join(['%s'] * len(recipe_ids))
+        + ') RETURNING {recipe}',
+        [user.id, *recipe_ids],
+        user='user_id', recipe='recipe_id'
+    )
+
+
+def add_recipes(user, model, recipe_ids):
+    """
+    Add recipes to the user's favorites or cart with one INSERT.
+    Returns the status of every id.
+    """
+    found = check_recipes(user, model, recipe_ids)
+    missing = [
+        recipe_id for recipe_id in recipe_ids
+        if found.get(recipe_id) is False
+    ]
+    added = insert_relations(user, model, missing) if missing else set()
+    if added:
+        relations_changed(model, user.id, list(added), 1)
+    return {
+        recipe_id: (
+            NOT_FOUND if recipe_id not in found
+            else ADDED if recipe_id in added else ALREADY_ADDED
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+def remove_recipes(user, model, recipe_ids):
+    """
+    Remove recipes from the user's favorites or cart with one
+    DELETE. Returns the status of every id.
+    """
+    found = check_recipes(user, model, recipe_ids)
+    listed = [recipe_id for recipe_id in recipe_ids if found.get(recipe_id)]
+    removed = delete_relations(user, model, listed) if listed else set()
+    if removed:
+        relations_changed(model, user.id, list(removed), -1)
+    return {
+        recipe_id: (
+            NOT_FOUND if recipe_id not in found
+            else REMOVED if recipe_id in removed else NOT_ADDED
+        )
+        for recipe_id in recipe_ids
+    }
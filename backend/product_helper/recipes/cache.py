@@ -0,0 +1,217 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import Recipes, Tag
+
+
+def _version_key(namespace):
+    return f'reference:{namespace}:version'
+
+
+def get_version(namespace):
+    """
+    Current (version, last modified timestamp) of a namespace.
+    """
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        version = _set_version(namespace)
+    return version
+
+
+def again_on_commit(func, *args):
+    """
+    Repeat a cache invalidation once the writer's transaction
+    commits, a read in between caches the rows it can still see
+    under the new version.
+    """
+    if connection.in_atomic_block:
+        transaction.on_commit(functools.partial(func, *args))
+
+
+def _set_version(namespace):
+    version = (time.time_ns(), int(time.time()))
+    cache.set(_version_key(namespace), version, None)
+    return version
+
+
+def bump_version(namespace):
+    version = _set_version(namespace)
+    again_on_commit(_set_version, namespace)
+    return version
+
+
+def get_tag_ids():
+    """
+    Tag ids by slug, cached until tags change.
+    """
+    version, _ = get_version('tags')
+    key = f'reference:tags:{version}:ids'
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, None)
+    return tag_ids
+
+
+class ReferenceDataCacheMixin:
+    """
+    Cache list and detail responses of reference data.
+    Cache keys carry the namespace version, which signals bump
+    when the data changes. Responses get a strong `ETag` and
+    `Last-Modified`, so clients can revalidate with `304`.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, method, request, *args, **kwargs):
+        version, last_modified = get_version(self.cache_namespace)
+        etag = f'"{self.cache_namespace}-{version}"'
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+        path = hashlib.md5(
+            request.get_full_path().encode('utf-8')
+        ).hexdigest()
+        key = f'reference:{self.cache_namespace}:{version}:{path}'
+        data = cache.get(key)
+        if data is None:
+            response = method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data)
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+def _recipe_prefix():
+    tags_version, _ = get_version('tags')
+    ingredients_version, _ = get_version('ingredients')
+    return f'recipe:{tags_version}:{ingredients_version}'
+
+
+def get_cached_recipes(recipe_ids):
+    """
+    User independent representations of recipes by recipe id.
+    """
+    prefix = _recipe_prefix()
+    cached = cache.get_many([f'{prefix}:{pk}' for pk in recipe_ids])
+    return {
+        int(key.rsplit(':', 1)[1]): data for key, data in cached.items()
+    }
+
+
+def cache_recipe(recipe_id, data):
+    cache.set(
+        f'{_recipe_prefix()}:{recipe_id}', data,
+        getattr(settings, 'RECIPE_CACHE_TIMEOUT', 60 * 60)
+    )
+
+
+def invalidate_recipes(recipe_ids):
+    prefix = _recipe_prefix()
+    cache.delete_many([f'{prefix}:{pk}' for pk in recipe_ids])
+
+
+def touch_recipes(recipe_ids):
+    """
+    Mark recipes as changed: drop their cached representations
+    and move their versions and the recipe list version.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    invalidate_recipes(recipe_ids)
+    again_on_commit(invalidate_recipes, recipe_ids)
+    Recipes.objects.filter(pk__in=recipe_ids).update(
+        version=F('version') + 1
+    )
+    bump_version('recipes')
+
+
+def user_namespace(user_id):
+    return f'user:{user_id}'
+
+
+class RecipeValidatorsMixin:
+    """
+    `ETag` and `Last-Modified` for recipe lists and details,
+    checked before the queryset is touched. Lists are validated
+    by the recipe list version, details by the recipe's version
+    column. Both include the tags and ingredients versions and
+    the version of the requesting user's favorites, cart and
+    follows, so per-user flags never go stale.
+    """
+    def validators(self, request, recipe_version=None):
+        namespaces = ['recipes', 'tags', 'ingredients']
+        if request.user.is_authenticated:
+            namespaces.append(user_namespace(request.user.id))
+        versions = [get_version(namespace) for namespace in namespaces]
+        if recipe_version is not None:
+            # a detail only changes with its own version
+            versions[0] = (recipe_version, versions[0][1])
+        key = hashlib.md5(repr((
+            request.user.id, request.get_full_path(),
+            [version for version, _ in versions]
+        )).encode('utf-8')).hexdigest()
+        # any recipe change moves the list timestamp, so it is a
+        # safe upper bound for details too
+        last_modified = max(modified for _, modified in versions)
+        return f'"recipes-{key}"', last_modified
+
+    def conditional_response(self, method, request, recipe_version=None,
+                             *args, **kwargs):
+        etag, last_modified = self.validators(request, recipe_version)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is None:
+            response = method(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        else:
+            response = not_modified
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, None, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            version = Recipes.objects.filter(
+                pk=kwargs[self.lookup_url_kwarg or self.lookup_field]
+            ).values_list('version', flat=True).first()
+        except ValueError:
+            version = None
+        if version is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            super().retrieve, request, version, *args, **kwargs
+        )
@@ -0,0 +1,63 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Follow, User
+from .models import Favorite, Recipes, ShoppingCart
+
+# (model, counter field, counted model, foreign key to the model)
+COUNTERS = (
+    (Recipes, 'favorites_count', Favorite, 'recipe'),
+    (Recipes, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipes, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+def update_counters(sender, instance, delta):
+    """
+    Move the counters that count `sender` rows by `delta` with an
+    UPDATE ... SET n = n + delta, in the caller's transaction.
+    """
+    update_counters_many(sender, [instance], delta)
+
+
+def update_counters_many(sender, instances, delta):
+    """
+    Same for rows written in bulk, one UPDATE per counter.
+    """
+    for model, field, counted, foreign_key in COUNTERS:
+        if counted is not sender:
+            continue
+        objects = model.objects.filter(pk__in=[
+            getattr(instance, f'{foreign_key}_id') for instance in instances
+        ])
+        if delta < 0:
+            objects = objects.filter(**{f'{field}__gte': -delta})
+        objects.update(**{field: F(field) + delta})
+
+
+def actual_count(counted, foreign_key):
+    return Coalesce(Subquery(
+        counted.objects.filter(
+            **{foreign_key: OuterRef('pk')}
+        ).order_by().values(foreign_key).annotate(
+            count=Count('*')
+        ).values('count')
+    ), 0)
+
+
+def recount():
+    """
+    Repair counters that drifted from the real counts, returns
+    the number of fixed rows by counter.
+    """
+    fixed = {}
+    for model, field, counted, foreign_key in COUNTERS:
+        actual = actual_count(counted, foreign_key)
+        drifted = model.objects.alias(actual=actual).exclude(
+            **{field: F('actual')}
+        ).values_list('pk', flat=True)
+        fixed[f'{model._meta.model_name}.{field}'] = model.objects.filter(
+            pk__in=drifted
+        ).update(**{field: actual})
+    return fixed
@@ -0,0 +1,173 @@
+import random
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from users.models import Follow, User
+from .counters import recount
+from .feed import rebuild_feeds
+from .models import (Favorite, FeedEntry, Ingredient, Recipes,
+                     RecipesIngredient, RecipesTag, ShoppingCart,
+                     ShoppingListItem, Tag)
+from .shopping_list import rebuild_shopping_lists
+
+BATCH_SIZE = 1000
+
+
+class PowerLawSampler:
+    """
+    Picks items with a Zipf-like popularity: the item at rank r is
+    chosen with weight 1 / r ** alpha. Ranks are shuffled, so the
+    popular items are not simply the first ones created.
+    """
+    def __init__(self, rng, items, alpha):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** alpha for rank in range(1, len(self.items) + 1)
+        ))
+
+    def choice(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect_left(self.cum_weights, point)]
+
+    def sample(self, k, exclude=None):
+        """
+        Up to k distinct items, fewer if the popular ones repeat.
+        """
+        chosen = {}
+        for _ in range(k * 3):
+            if len(chosen) >= k:
+                break
+            item = self.choice()
+            if item is not exclude:
+                chosen[id(item)] = item
+        return list(chosen.values())
+
+
+def generate_dataset(users=200, recipes=2000, ingredients=500, tags=8,
+                     favorites=10, carts=3, follows=5, alpha=1.1, seed=0,
+                     reuse_reference=False):
+    """
+    Fill the database with a synthetic dataset of the given size.
+    Authorship, ingredients, tags, favorites, carts and follows
+    follow power-law popularity; `favorites`, `carts` and
+    `follows` are averages per user. With `reuse_reference` the
+    ingredients and tags already loaded are used when there are
+    any. Everything is written with `bulk_create`, the counters,
+    feeds and shopping lists are rebuilt after, returns row counts
+    by model.
+    """
+    rng = random.Random(seed)
+    password = make_password(None)
+    # unique names for every run, the seed only drives the content
+    prefix = f'dataset{uuid.uuid4().hex[:8]}'
+
+    def create(model, objs, **lookup):
+        model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+        if lookup:
+            # not every backend sets primary keys in bulk_create
+            return list(model.objects.filter(**lookup).order_by('id'))
+
+    def per_user(mean):
+        # heavy tailed activity, a few users do most of it
+        return min(int(rng.paretovariate(2) * mean / 2), mean * 20)
+
+    user_objs = create(User, (
+        User(email=f'{prefix}_{i}@example.com', username=f'{prefix}_{i}',
+             password=password)
+        for i in range(users)
+    ), username__startswith=prefix)
+    tag_objs = list(Tag.objects.all()) if reuse_reference else []
+    if not tag_objs:
+        colors = set(Tag.objects.values_list('color', flat=True))
+
+        def new_color():
+            # colors are unique too, skip the ones earlier runs took
+            while True:
+                color = f'#{rng.randrange(16 ** 6):06X}'
+                if color not in colors:
+                    colors.add(color)
+                    return color
+
+        tag_objs = create(Tag, (
+            Tag(name=f'{prefix}_{i}', slug=f'{prefix}_{i}',
+                color=new_color())
+            for i in range(tags)
+        ), slug__startswith=prefix)
+    ingredient_objs = (
+        list(Ingredient.objects.all()) if reuse_reference else []
+    )
+    if not ingredient_objs:
+        ingredient_objs = create(Ingredient, (
+            Ingredient(name=f'{prefix}_{i}', measurement_unit='g')
+            for i in range(ingredients)
+        ), name__startswith=prefix)
+
+    authors = PowerLawSampler(rng, user_objs, alpha)
+    recipe_objs = create(Recipes, (
+        Recipes(author=authors.choice(), name=f'{prefix} recipe {i}',
+                text='text', cooking_time=rng.randint(5, 120))
+        for i in range(recipes)
+    ), name__startswith=prefix)
+
+    tag_sampler = PowerLawSampler(rng, tag_objs, 0.8)
+    create(RecipesTag, (
+        RecipesTag(recipe=recipe, tag=tag)
+        for recipe in recipe_objs
+        for tag in tag_sampler.sample(
+            rng.choices((1, 2, 3), (5, 3, 1))[0]
+        )
+    ))
+    ingredient_sampler = PowerLawSampler(rng, ingredient_objs, alpha)
+    create(RecipesIngredient, (
+        RecipesIngredient(recipe=recipe, ingredient=ingredient,
+                          amount=rng.randint(1, 500))
+        for recipe in recipe_objs
+        for ingredient in ingredient_sampler.sample(
+            max(2, min(20, round(rng.gauss(8, 3))))
+        )
+    ))
+
+    popular_recipes = PowerLawSampler(rng, recipe_objs, alpha)
+    create(Favorite, (
+        Favorite(user=user, recipe=recipe)
+        for user in user_objs
+        for recipe in popular_recipes.sample(per_user(favorites))
+    ))
+    create(ShoppingCart, (
+        ShoppingCart(user=user, recipe=recipe)
+        for user in user_objs
+        for recipe in popular_recipes.sample(per_user(carts))
+    ))
+    create(Follow, (
+        Follow(user=user, following=author)
+        for user in user_objs
+        for author in authors.sample(per_user(follows), exclude=user)
+    ))
+    recount()
+    rebuild_feeds()
+    rebuild_shopping_lists()
+    return {
+        model._meta.verbose_name: model.objects.count()
+        for model in (User, Tag, Ingredient, Recipes, RecipesTag,
+                      RecipesIngredient, Favorite, ShoppingCart, Follow,
+                      FeedEntry, ShoppingListItem)
+    }
+
+
+@contextmanager
+def temporary_dataset(existing=False, **sizes):
+    """
+    Generated dataset that is rolled back on exit, yields row
+    counts. With `existing` the data already in the database is
+    used as is.
+    """
+    with transaction.atomic():
+        yield {} if existing else generate_dataset(**sizes)
+        transaction.set_rollback(True)
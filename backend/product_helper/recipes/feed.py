@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.db import transaction
+
+from users.models import Follow, User
+from users.serializers import get_latest_recipes
+from .models import FeedEntry, Recipes
+
+BATCH_SIZE = 1000
+AUTHORS_CHUNK = 500
+
+
+def followers_count(author_id):
+    return User.objects.filter(pk=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+
+
+def is_celebrity(count):
+    return count is not None and count > settings.FEED_CELEBRITY_FOLLOWERS
+
+
+def latest_recipes(author_id):
+    return Recipes.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).only('id', 'author_id', 'pub_date')[:settings.FEED_BACKFILL]
+
+
+def push(user_ids, recipes):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                      author_id=recipe.author_id, pub_date=recipe.pub_date)
+            for user_id in user_ids for recipe in recipes
+        ),
+        batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(recipe):
+    """
+    Push a new recipe to the feeds of its author's followers.
+    Followers of celebrities read it from the author instead.
+    """
+    if is_celebrity(followers_count(recipe.author_id)):
+        return
+    push(
+        Follow.objects.filter(following_id=recipe.author_id).values_list(
+            'user_id', flat=True
+        ),
+        [recipe]
+    )
+
+
+def follow(user_id, author_id):
+    if not is_celebrity(followers_count(author_id)):
+        push([user_id], latest_recipes(author_id))
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    if followers_count(author_id) == settings.FEED_CELEBRITY_FOLLOWERS:
+        # not a celebrity any more, later recipes will be fanned out
+        transaction.on_commit(lambda: refill_followers(author_id))
+
+
+def refill_followers(author_id):
+    count = followers_count(author_id)
+    if count and not is_celebrity(count):
+        push(
+            Follow.objects.filter(following_id=author_id).values_list(
+                'user_id', flat=True
+            ),
+            list(latest_recipes(author_id))
+        )
+
+
+def rebuild_feeds():
+    """
+    Refill every feed from the follows, as if everyone had just
+    followed their authors, for data written without signals.
+    Returns the number of entries.
+    """
+    FeedEntry.objects.all().delete()
+    authors = list(User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lte=settings.FEED_CELEBRITY_FOLLOWERS
+    ).order_by('id').values_list('id', flat=True))
+    for start in range(0, len(authors), AUTHORS_CHUNK):
+        chunk = authors[start:start + AUTHORS_CHUNK]
+        recipes = get_latest_recipes(chunk, settings.FEED_BACKFILL)
+        for author_id, followers in group_followers(chunk):
+            push(followers, recipes.get(author_id, ()))
+    return FeedEntry.objects.count()
+
+
+def group_followers(author_ids):
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+        following_id__in=author_ids
+    ).values_list('user_id', 'following_id').iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    return followers.items()
+
+
+def after(queryset, position, id_field):
+    if position is None:
+        return queryset
+    pub_date, recipe_id = position
+    return queryset.filter(pub_date__lte=pub_date).exclude(
+        pub_date=pub_date, **{f'{id_field}__gte': recipe_id}
+    )
+
+
+def before(queryset, position, id_field):
+    pub_date, recipe_id = position
+    return queryset.filter(pub_date__gte=pub_date).exclude(
+        pub_date=pub_date, **{f'{id_field}__lte': recipe_id}
+    )
+
+
+def pushed_entries(user, position=None):
+    return after(
+        FeedEntry.objects.filter(user=user), position, 'recipe_id'
+    ).select_related('recipe__author').order_by('-pub_date', '-recipe_id')
+
+
+def pulled_recipes(user, position=None):
+    return after(
+        Recipes.objects.filter(author_id__in=Follow.objects.filter(
+            user=user,
+            following__followers_count__gt=(
+                settings.FEED_CELEBRITY_FOLLOWERS
+            )
+        ).values('following_id')), position, 'id'
+    ).select_related('author').order_by('-pub_date', '-id')
+
+
+def feed_page(user, limit, position=None):
+    """
+    Up to `limit` recipes of a user's feed, newest first, after
+    the (pub_date, id) `position`. Pushed recipes are one range
+    scan of the feed index, recipes of followed celebrities are
+    read by author and merged in.
+    """
+    recipes = {
+        entry.recipe_id: entry.recipe
+        for entry in pushed_entries(user, position)[:limit]
+    }
+    recipes.update(
+        (recipe.id, recipe)
+        for recipe in pulled_recipes(user, position)[:limit]
+    )
+    return sorted(
+        recipes.values(), key=lambda recipe: (recipe.pub_date, recipe.id),
+        reverse=True
+    )[:limit]
@@ -0,0 +1,109 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .cache import touch_recipes
+from .models import Recipes
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_SIZE = getattr(settings, 'RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024)
+IMAGE_VARIANTS = {
+    'list': ((480, 320), 'JPEG', 'jpg'),
+    'detail': ((1200, 800), 'JPEG', 'jpg'),
+    'webp': ((1200, 800), 'WEBP', 'webp'),
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'RECIPE_IMAGE_WORKERS', 2),
+    thread_name_prefix='recipe-images'
+)
+
+
+def variant_name(name, variant):
+    _, _, ext = IMAGE_VARIANTS[variant]
+    root, _ = os.path.splitext(name)
+    return f'{root}_{variant}.{ext}'
+
+
+def variant_urls(recipe):
+    """
+    Storage urls of the recipe image variants, empty until the
+    worker has built all of them for the current image.
+    """
+    image = recipe.image
+    if not image or recipe.image_variants_of != image.name:
+        return {}
+    return {
+        variant: default_storage.url(variant_name(image.name, variant))
+        for variant in IMAGE_VARIANTS
+    }
+
+
+def _resize(source, size, image_format):
+    image = source.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=85)
+    return buffer.getvalue()
+
+
+def generate_variants(name):
+    with default_storage.open(name, 'rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source.load()
+    for variant, (size, image_format, _) in IMAGE_VARIANTS.items():
+        target = variant_name(name, variant)
+        if default_storage.exists(target):
+            continue
+        default_storage.save(
+            target, ContentFile(_resize(source, size, image_format))
+        )
+
+
+def _process(recipe_id, name):
+    # pool threads outlive the request, drop broken or expired
+    # connections like request_started/finished do
+    close_old_connections()
+    try:
+        _build(recipe_id, name)
+    finally:
+        close_old_connections()
+
+
+def _build(recipe_id, name):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception('Could not build variants of %s', name)
+    else:
+        # a newer image may have been saved meanwhile
+        Recipes.objects.filter(pk=recipe_id, image=name).update(
+            image_variants_of=name
+        )
+        touch_recipes([recipe_id])
+
+
+def schedule_variants(recipe):
+    """
+    Build the image variants in a worker thread after the
+    transaction that saved the recipe is committed.
+    """
+    if not recipe.image:
+        return
+    recipe_id, name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: _executor.submit(_process, recipe_id, name)
+    )
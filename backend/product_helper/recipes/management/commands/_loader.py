@@ -0,0 +1,84 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+
+
+class BulkLoadCommand(BaseCommand):
+    """
+    Base command for idempotent loading of reference data.
+    Rows are deduplicated in memory and written with batched
+    `bulk_create(ignore_conflicts=True)` in one transaction,
+    so rows that already exist are skipped by the database.
+    """
+    model = None
+    fields = ()
+    default_name = None
+    missing_file_message = 'Add data file to dir data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', nargs='?', type=str)
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            default='csv')
+        parser.add_argument('--batch-size', default=500, type=int)
+
+    def read_csv(self, file):
+        for row in csv.reader(file):
+            if not row:
+                continue
+            if len(row) != len(self.fields):
+                raise ValueError(f'expected {len(self.fields)} columns')
+            yield dict(zip(self.fields, row))
+
+    def read_json(self, file):
+        for row in json.load(file):
+            yield {field: row[field] for field in self.fields}
+
+    def unique_rows(self, rows):
+        seen = set()
+        for row in rows:
+            self.rows_read += 1
+            key = tuple(row[field].strip() for field in self.fields)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield self.model(**dict(zip(self.fields, key)))
+
+    def after_load(self):
+        pass
+
+    def handle(self, *args, **options):
+        data_format = options['format']
+        filename = options['filename'] or f'{self.default_name}.{data_format}'
+        read = self.read_json if data_format == 'json' else self.read_csv
+        batch_size = options['batch_size']
+        try:
+            with open(os.path.join(DATA_ROOT, filename), 'r',
+                      encoding='utf-8') as f:
+                self.rows_read = 0
+                objs = self.unique_rows(read(f))
+                with transaction.atomic():
+                    count_before = self.model.objects.count()
+                    while True:
+                        batch = list(islice(objs, batch_size))
+                        if not batch:
+                            break
+                        self.model.objects.bulk_create(
+                            batch, ignore_conflicts=True
+                        )
+                    inserted = self.model.objects.count() - count_before
+        except FileNotFoundError:
+            raise CommandError(self.missing_file_message)
+        except (KeyError, ValueError) as error:
+            raise CommandError(f'Wrong data in {filename}: {error}')
+        self.after_load()
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.model._meta.verbose_name}: {inserted} inserted, '
+            f'{self.rows_read - inserted} skipped'
+        ))
@@ -0,0 +1,409 @@
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+from datetime import datetime
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipes, Tag
+from users.models import Follow, User
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+PAGE_SIZE = 6
+BATCH_RECIPES = 12
+
+
+class ClientTransport:
+    """
+    Requests through the Django test client, in process.
+    """
+    def __init__(self, token):
+        self.client = Client(
+            raise_request_exception=False,
+            HTTP_AUTHORIZATION=f'Token {token}'
+        )
+
+    def request(self, method, path, body=None):
+        if body is None:
+            response = getattr(self.client, method)(path)
+        else:
+            response = getattr(self.client, method)(
+                path, json.dumps(body), content_type='application/json'
+            )
+        content = (b''.join(response.streaming_content)
+                   if response.streaming else response.content)
+        return response.status_code, response.get('Server-Timing'), content
+
+
+class AsgiTransport:
+    """
+    Requests through Django's async test client, in process. All
+    of them are served by one event loop, like one ASGI worker.
+    """
+    _loop = None
+    _lock = threading.Lock()
+
+    def __init__(self, token):
+        self.client = AsyncClient(raise_request_exception=False)
+        self.authorization = f'Token {token}'
+
+    @classmethod
+    def loop(cls):
+        with cls._lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=cls._loop.run_forever, daemon=True
+                ).start()
+        return cls._loop
+
+    def request(self, method, path, body=None):
+        if body is None:
+            request = getattr(self.client, method)(
+                path, authorization=self.authorization
+            )
+        else:
+            request = getattr(self.client, method)(
+                path, json.dumps(body), content_type='application/json',
+                authorization=self.authorization
+            )
+        response = asyncio.run_coroutine_threadsafe(
+            request, self.loop()
+        ).result()
+        content = (b''.join(response.streaming_content)
+                   if response.streaming else response.content)
+        return response.status_code, response.get('Server-Timing'), content
+
+
+class HttpTransport:
+    """
+    Requests to a running server.
+    """
+    def __init__(self, base_url, token):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'Token {token}',
+                        'Content-Type': 'application/json'}
+
+    def request(self, method, path, body=None):
+        request = urllib.request.Request(
+            self.base_url + path, method=method.upper(),
+            headers=self.headers,
+            data=None if body is None else json.dumps(body).encode()
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return (response.status,
+                        response.headers.get('Server-Timing'),
+                        response.read())
+        except urllib.error.HTTPError as error:
+            return (error.code, error.headers.get('Server-Timing'),
+                    error.read())
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    """
+    Load test the API routes at several concurrency levels
+    """
+    help = ('benchmark every API route: latency percentiles, queries '
+            'per request and throughput, saved as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16',
+                            help='comma separated worker counts')
+        parser.add_argument('--requests', default=50, type=int,
+                            help='requests per route and level')
+        parser.add_argument('--url', help='base url of a running server, '
+                            'the test client is used without it')
+        parser.add_argument('--asgi', action='store_true',
+                            help='use the async test client, run with '
+                                 'ASYNC_VIEWS=True for the async views')
+        parser.add_argument('--routes', help='comma separated route names')
+        parser.add_argument('--output', help='json file for the results')
+        parser.add_argument('--compare', help='json file of an earlier run')
+
+    def routes(self, user):
+        """
+        Route name -> steps of (label, method, path, body). A step
+        path may be a function of the previous step's response.
+        """
+        recipe = Recipes.objects.filter(author=user).first() or (
+            Recipes.objects.first()
+        )
+        free_recipe = Recipes.objects.exclude(
+            favorite__user=user
+        ).exclude(carts__user=user).order_by('-id').first()
+        author = User.objects.exclude(pk=user.pk).exclude(
+            author__user=user
+        ).order_by('-recipes_count').first()
+        batch = {'recipes': list(Recipes.objects.exclude(
+            carts__user=user
+        ).order_by('-id').values_list('id', flat=True)[:BATCH_RECIPES])}
+        ingredient = Ingredient.objects.order_by('id').first()
+        tags = Tag.objects.order_by('id')[:2]
+        recipe_body = {
+            'name': 'benchmark', 'text': 'benchmark', 'cooking_time': 10,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+        }
+        tag_query = '&'.join(f'tags={tag.slug}' for tag in tags)
+        recipes_url = reverse('recipe-list')
+        cart_batch_url = reverse('recipe-shopping-cart-batch')
+        # pages are only limited when asked to, like the frontend does
+        page = f'?limit={PAGE_SIZE}'
+
+        def recipe_url(data):
+            return reverse('recipe-detail', args=[data['id']])
+
+        def get(name, path):
+            return [(name, 'get', path, None)]
+
+        return {
+            'recipe-list': get('recipe-list', recipes_url + page),
+            'recipe-list-tags': get(
+                'recipe-list-tags', f'{recipes_url}{page}&{tag_query}'
+            ),
+            'recipe-list-search': get(
+                'recipe-list-search',
+                f'{recipes_url}{page}&{urlencode({"search": recipe.name})}'
+            ),
+            'recipe-list-favorited': get(
+                'recipe-list-favorited', f'{recipes_url}{page}&is_favorited=1'
+            ),
+            'recipe-feed': get('recipe-feed', reverse('recipe-feed') + page),
+            'recipe-detail': get(
+                'recipe-detail', reverse('recipe-detail', args=[recipe.id])
+            ),
+            'recipe-shopping-list': get(
+                'recipe-shopping-list', reverse('recipe-shopping-list')
+            ),
+            'recipe-download-shopping-cart': get(
+                'recipe-download-shopping-cart',
+                reverse('recipe-download-shopping-cart') + '?format=txt'
+            ),
+            'recipe-write': [
+                ('recipe-create', 'post', recipes_url, recipe_body),
+                ('recipe-update', 'patch', recipe_url, recipe_body),
+                ('recipe-destroy', 'delete', recipe_url, None),
+            ],
+            'recipe-favorite': [
+                ('recipe-favorite', 'post', reverse(
+                    'recipe-favorite', args=[free_recipe.id]
+                ), None),
+                ('recipe-favorite-delete', 'delete', reverse(
+                    'recipe-favorite', args=[free_recipe.id]
+                ), None),
+            ],
+            'recipe-shopping-cart': [
+                ('recipe-shopping-cart', 'post', reverse(
+                    'recipe-shopping-cart', args=[free_recipe.id]
+                ), None),
+                ('recipe-shopping-cart-delete', 'delete', reverse(
+                    'recipe-shopping-cart', args=[free_recipe.id]
+                ), None),
+            ],
+            'recipe-cart-batch': [
+                ('recipe-cart-batch', 'post', cart_batch_url, batch),
+                ('recipe-cart-batch-delete', 'delete', cart_batch_url, batch),
+            ],
+            'ingredients-list': get(
+                'ingredients-list',
+                reverse('ingredients-list') + f'?name={ingredient.name[:2]}'
+            ),
+            'ingredients-detail': get(
+                'ingredients-detail',
+                reverse('ingredients-detail', args=[ingredient.id])
+            ),
+            'tags-list': get('tags-list', reverse('tags-list')),
+            'tags-detail': get(
+                'tags-detail', reverse('tags-detail', args=[tags[0].id])
+            ),
+            'users-list': get('users-list', reverse('users-list') + page),
+            'users-detail': get(
+                'users-detail', reverse('users-detail', args=[author.id])
+            ),
+            'users-me': get('users-me', reverse('users-me')),
+            'subscriptions': get(
+                'subscriptions',
+                reverse('subscriptions') + page + '&recipes_limit=3'
+            ),
+            'users-subscribe': [
+                ('users-subscribe', 'post', reverse(
+                    'users-subscribe', args=[author.id]
+                ), None),
+                ('users-subscribe-delete', 'delete', reverse(
+                    'users-subscribe', args=[author.id]
+                ), None),
+            ],
+        }
+
+    def worker(self, transport, steps, iterations, samples, lock):
+        measured = []
+        try:
+            for _ in range(iterations):
+                data = None
+                for label, method, path, body in steps:
+                    if callable(path):
+                        path = path(data)
+                    start = time.perf_counter()
+                    try:
+                        status, timing, content = transport.request(
+                            method, path, body
+                        )
+                    except OSError:
+                        status, timing, content = 599, None, b''
+                    elapsed = time.perf_counter() - start
+                    queries = QUERIES.search(timing or '')
+                    measured.append((
+                        label, elapsed, status < 400,
+                        int(queries.group(1)) if queries else None
+                    ))
+                    if status >= 400:
+                        break
+                    if content and method == 'post':
+                        data = json.loads(content)
+        finally:
+            connections.close_all()
+            with lock:
+                samples.extend(measured)
+
+    def run_route(self, transports, worker_steps, concurrency, requests):
+        samples = []
+        lock = threading.Lock()
+        iterations = max(1, requests // concurrency)
+        threads = [
+            threading.Thread(
+                target=self.worker,
+                args=(transport, steps, iterations, samples, lock)
+            )
+            for transport, steps in zip(transports, worker_steps)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        results = []
+        for label, method, _, _ in worker_steps[0]:
+            times = [s[1] for s in samples if s[0] == label]
+            if not times:
+                continue
+            queries = [s[3] for s in samples
+                       if s[0] == label and s[3] is not None]
+            results.append({
+                'route': label,
+                'method': method.upper(),
+                'concurrency': concurrency,
+                'requests': len(times),
+                'errors': sum(1 for s in samples
+                              if s[0] == label and not s[2]),
+                'p50_ms': round(percentile(times, 50) * 1000, 2),
+                'p95_ms': round(percentile(times, 95) * 1000, 2),
+                'p99_ms': round(percentile(times, 99) * 1000, 2),
+                'queries': (round(sum(queries) / len(queries), 1)
+                            if queries else None),
+                'throughput_rps': round(len(times) / wall, 1),
+            })
+        return results
+
+    def write_row(self, row, previous=None):
+        line = (f'{row["route"]:<30}{row["concurrency"]:>4}'
+                f'{row["p50_ms"]:>10.1f}{row["p95_ms"]:>10.1f}'
+                f'{row["p99_ms"]:>10.1f}'
+                f'{row["queries"] if row["queries"] is not None else "-":>9}'
+                f'{row["throughput_rps"]:>10.1f}{row["errors"]:>7}')
+        if previous:
+            change = (row['p95_ms'] - previous['p95_ms']) / max(
+                previous['p95_ms'], 0.01
+            ) * 100
+            line += f'{change:>+10.0f}%'
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        started = datetime.now()
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        users = list(User.objects.filter(
+            subscriber__isnull=False, is_active=True
+        ).distinct().order_by('id')[:max(levels)])
+        if len(users) < max(levels):
+            raise CommandError(
+                'not enough users with follows, run generate_dataset first'
+            )
+        tokens = [Token.objects.get_or_create(user=user)[0].key
+                  for user in users]
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = {
+                    (row['route'], row['concurrency']): row
+                    for row in json.load(file)['results']
+                }
+        selected = (options['routes'].split(',')
+                    if options['routes'] else None)
+        self.stdout.write(
+            f'{"route":<30}{"c":>4}{"p50, ms":>10}{"p95, ms":>10}'
+            f'{"p99, ms":>10}{"queries":>9}{"req/s":>10}{"errors":>7}'
+            + (f'{"p95 diff":>11}' if previous else '')
+        )
+        if options['url']:
+            target = options['url']
+            transport = partial(HttpTransport, options['url'])
+        elif options['asgi']:
+            target, transport = 'async test client', AsgiTransport
+        else:
+            target, transport = 'test client', ClientTransport
+        results = []
+        with override_settings(METRICS_SERVER_TIMING=True):
+            per_user = [self.routes(user) for user in users]
+            for name in per_user[0]:
+                if selected and name not in selected:
+                    continue
+                for level in levels:
+                    transports = [
+                        transport(token) for token in tokens[:level]
+                    ]
+                    # every worker writes its own user's rows
+                    rows = self.run_route(
+                        transports,
+                        [routes[name] for routes in per_user[:level]],
+                        level, options['requests']
+                    )
+                    for row in rows:
+                        self.write_row(row, previous.get(
+                            (row['route'], row['concurrency'])
+                        ))
+                    results.extend(rows)
+        output = options['output'] or (
+            f'benchmark-{started:%Y%m%d-%H%M%S}.json'
+        )
+        with open(output, 'w') as file:
+            json.dump({
+                'started': started.isoformat(timespec='seconds'),
+                'target': target,
+                'async_views': settings.ASYNC_VIEWS,
+                'database': connection.vendor,
+                'dataset': {
+                    'users': User.objects.count(),
+                    'recipes': Recipes.objects.count(),
+                    'follows': Follow.objects.count(),
+                },
+                'results': results,
+            }, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'results saved to {output}'))
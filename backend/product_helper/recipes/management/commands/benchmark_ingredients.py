@@ -0,0 +1,47 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient
+from recipes.serializers import IngredientSerializer
+
+
+class Command(BaseCommand):
+    """
+    Compare ingredient autocomplete through the ORM and the index
+    """
+    help = 'benchmark ingredient search: ORM vs in-memory index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*',
+                            default=['а', 'мо', 'сах', 'кур', 'Ябл', 'x'])
+        parser.add_argument('--repeat', default=200, type=int)
+
+    def orm_search(self, query):
+        return IngredientSerializer(
+            Ingredient.objects.filter(name__istartswith=query), many=True
+        ).data
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        ingredient_index.build()
+        self.stdout.write(f'{"query":<10}{"found":>8}{"orm, us":>12}'
+                          f'{"index, us":>12}{"queries":>9}')
+        for query in options['queries']:
+            orm_time = timeit.timeit(
+                lambda: self.orm_search(query), number=repeat
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                index_time = timeit.timeit(
+                    lambda: ingredient_index.search(query), number=repeat
+                )
+            found = len(ingredient_index.search(query))
+            self.stdout.write(
+                f'{query:<10}{found:>8}'
+                f'{orm_time / repeat * 1e6:>12.1f}'
+                f'{index_time / repeat * 1e6:>12.1f}'
+                f'{len(ctx.captured_queries):>9}'
+            )
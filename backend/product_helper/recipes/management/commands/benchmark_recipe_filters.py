@@ -0,0 +1,97 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from recipes.dataset import temporary_dataset
+from recipes.filters import RecipeFilter
+from recipes.models import Recipes, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Time the recipe list filters on combinations of tags
+    """
+    help = ('benchmark recipe filtering by tags, favorites and cart '
+            'against the old join + DISTINCT query')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=500, type=int)
+        parser.add_argument('--recipes', default=5000, type=int)
+        parser.add_argument('--repeat', default=20, type=int)
+        parser.add_argument('--existing', action='store_true',
+                            help='use the data already in the database')
+
+    def filtered(self, user, slugs, favorited, in_cart):
+        request = RequestFactory().get('/')
+        request.user = user
+        params = QueryDict(mutable=True)
+        params.setlist('tags', slugs)
+        if favorited:
+            params['is_favorited'] = 'true'
+        if in_cart:
+            params['is_in_shopping_cart'] = 'true'
+        return list(RecipeFilter(
+            params, queryset=Recipes.objects.all(), request=request
+        ).qs[:6])
+
+    def joined(self, user, slugs, favorited, in_cart):
+        # what AllValuesMultipleFilter used to run
+        list(Recipes.objects.values_list(
+            'tags__slug', flat=True
+        ).distinct().order_by('tags__slug'))
+        recipes = Recipes.objects.filter(tags__slug__in=slugs)
+        if favorited:
+            recipes = recipes.filter(favorite__user=user)
+        if in_cart:
+            recipes = recipes.filter(carts__user=user)
+        return list(recipes.distinct()[:6])
+
+    def cases(self, slugs):
+        for size in range(1, min(len(slugs), 3) + 1):
+            yield slugs[:size], False, False
+        yield slugs[:2], True, False
+        yield slugs[:2], False, True
+        yield slugs[:2], True, True
+        yield slugs, True, True
+
+    def measure(self, method, repeat, *args):
+        with CaptureQueriesContext(connection) as ctx:
+            method(*args)
+        seconds = timeit.timeit(lambda: method(*args), number=repeat)
+        return seconds / repeat * 1e3, len(ctx.captured_queries)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with temporary_dataset(
+            options['existing'],
+            users=options['users'], recipes=options['recipes']
+        ):
+            user = User.objects.filter(favorite__isnull=False).first()
+            slugs = list(Tag.objects.values_list('slug', flat=True))
+            self.filtered(user, slugs[:1], False, False)
+            self.stdout.write(f'{"case":<28}{"join, ms":>10}{"queries":>9}'
+                              f'{"subquery, ms":>12}{"queries":>9}')
+            for case in self.cases(slugs):
+                tags, favorited, in_cart = case
+                name = ' '.join(
+                    [f'{len(tags)} tags'] + [
+                        flag for flag, used in (
+                            ('favorited', favorited), ('cart', in_cart)
+                        ) if used
+                    ]
+                )
+                join_ms, join_queries = self.measure(
+                    self.joined, repeat, user, *case
+                )
+                exists_ms, exists_queries = self.measure(
+                    self.filtered, repeat, user, *case
+                )
+                self.stdout.write(
+                    f'{name:<28}{join_ms:>10.2f}{join_queries:>9}'
+                    f'{exists_ms:>12.2f}{exists_queries:>9}'
+                )
@@ -0,0 +1,178 @@
+import re
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from recipes.dataset import temporary_dataset
+from recipes.feed import pulled_recipes, pushed_entries
+from recipes.filters import RecipeFilter
+from recipes.models import (Favorite, Recipes, RecipesIngredient,
+                            ShoppingCart, Tag)
+from recipes.shopping_list import get_shopping_list
+from users.models import Follow, User
+from users.serializers import latest_recipes_sql
+from users.views import FollowListView
+
+PG_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)( USING)?')
+# an FTS5 table walked by MATCH has an M in its index string
+SQLITE_MATCH = re.compile(r'\bSCAN \w+ VIRTUAL TABLE INDEX \d+:\S*M')
+
+
+def seq_scans(vendor, plan):
+    """
+    Tables read in full by a plan. SQLite walking a whole index is
+    only fine when it gives the order, not followed by a sort, and
+    an FTS5 MATCH only reads the matching rows.
+    """
+    if vendor == 'postgresql':
+        return PG_SEQ_SCAN.findall(plan)
+    sorted_later = 'TEMP B-TREE FOR ORDER BY' in plan
+    return [
+        table for table, using in SQLITE_SCAN.findall(
+            SQLITE_MATCH.sub('', plan)
+        )
+        if not using or sorted_later
+    ]
+
+
+class Command(BaseCommand):
+    """
+    EXPLAIN the queries behind the API endpoints
+    """
+    help = ('explain hot queries on a generated dataset and fail on '
+            'sequential scans of big tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=1000, type=int)
+        parser.add_argument('--recipes', default=10000, type=int)
+        parser.add_argument('--threshold', default=1000, type=int,
+                            help='tables with more rows must not be '
+                                 'scanned sequentially')
+        parser.add_argument('--existing', action='store_true',
+                            help='use the data already in the database')
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def request(self, user, **params):
+        request = RequestFactory().get('/')
+        request.user = user
+        request.query_params = QueryDict(mutable=True)
+        for name, value in params.items():
+            request.query_params.setlist(
+                name, value if isinstance(value, list) else [str(value)]
+            )
+        return request
+
+    def recipes(self, user, **params):
+        request = self.request(user, **params)
+        recipes = RecipeFilter(
+            request.query_params,
+            queryset=Recipes.objects.select_related('author'),
+            request=request
+        )
+        if not recipes.is_valid():
+            raise CommandError(f'bad filter {params}: {recipes.errors}')
+        return recipes.qs[:6]
+
+    def queries(self, user):
+        recipe_ids = list(
+            Recipes.objects.values_list('id', flat=True)[:6]
+        )
+        author_ids = list(
+            Follow.objects.filter(user=user).values_list(
+                'following_id', flat=True
+            )[:6]
+        )
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        follow_view = FollowListView()
+        follow_view.request = self.request(user)
+        return {
+            'viewer follows': Follow.objects.filter(
+                user=user
+            ).order_by().values_list('following_id'),
+            'viewer favorites': Favorite.objects.filter(
+                user=user
+            ).order_by().values_list('recipe_id'),
+            'viewer cart': ShoppingCart.objects.filter(
+                user=user
+            ).order_by().values_list('recipe_id'),
+            'recipe list': self.recipes(user),
+            'recipes by author': self.recipes(user, author=user.id),
+            'recipes by tags': self.recipes(user, tags=tags),
+            'favorited recipes': self.recipes(user, is_favorited='true'),
+            'recipes in cart': self.recipes(
+                user, is_in_shopping_cart='true'
+            ),
+            'recipe search': self.recipes(user, search='recipe 1'),
+            'feed': pushed_entries(user)[:6],
+            'feed celebrities': pulled_recipes(user)[:6],
+            'prefetch tags': Tag.objects.filter(recipes__in=recipe_ids),
+            'prefetch ingredients': RecipesIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).select_related('ingredient'),
+            'shopping list': get_shopping_list(user),
+            'subscriptions': follow_view.get_queryset()[:6],
+            'latest recipes': latest_recipes_sql(author_ids or [0], 3),
+            'followers': Follow.objects.filter(following=user),
+        }
+
+    def explain(self, query):
+        if isinstance(query, tuple):
+            sql, params = query
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'{connection.ops.explain_query_prefix()} {sql}', params
+                )
+                return '\n'.join(
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                )
+        return query.explain()
+
+    def check_plans(self, threshold, verbose):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'{connection.vendor} is not supported')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        sizes = {
+            model._meta.db_table: model.objects.count()
+            for model in apps.get_models()
+        }
+        user = User.objects.filter(subscriber__isnull=False).first()
+        if user is None:
+            raise CommandError('no data to explain, drop --existing')
+        failures = []
+        for name, query in self.queries(user).items():
+            plan = self.explain(query)
+            scans = [
+                table for table in seq_scans(connection.vendor, plan)
+                if sizes.get(table, 0) > threshold
+            ]
+            status = (self.style.ERROR('SEQ SCAN ' + ', '.join(scans))
+                      if scans else self.style.SUCCESS('ok'))
+            self.stdout.write(f'{name:<22}{status}')
+            if verbose or scans:
+                self.stdout.write(plan)
+            if scans:
+                failures.append(name)
+        return failures
+
+    def handle(self, *args, **options):
+        with temporary_dataset(
+            options['existing'],
+            users=options['users'], recipes=options['recipes']
+        ) as counts:
+            self.stdout.write(', '.join(
+                f'{name}: {count}' for name, count in counts.items()
+            ))
+            failures = self.check_plans(
+                options['threshold'], options['verbose_plans']
+            )
+        if failures:
+            raise CommandError(
+                f'sequential scans in: {", ".join(failures)}'
+            )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.dataset import generate_dataset
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with synthetic data for load testing
+    """
+    help = ('generate users, recipes, favorites, carts and follows '
+            'with power-law popularity')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=1000, type=int)
+        parser.add_argument('--recipes', default=10000, type=int)
+        parser.add_argument('--ingredients', default=2000, type=int)
+        parser.add_argument('--tags', default=8, type=int)
+        parser.add_argument('--favorites', default=10, type=int,
+                            help='average favorites per user')
+        parser.add_argument('--carts', default=3, type=int,
+                            help='average recipes in a cart')
+        parser.add_argument('--follows', default=5, type=int,
+                            help='average follows per user')
+        parser.add_argument('--alpha', default=1.1, type=float,
+                            help='power-law exponent of popularity')
+        parser.add_argument('--seed', default=0, type=int)
+        parser.add_argument('--reuse-reference', action='store_true',
+                            help='use loaded ingredients and tags')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            counts = generate_dataset(
+                users=options['users'], recipes=options['recipes'],
+                ingredients=options['ingredients'], tags=options['tags'],
+                favorites=options['favorites'], carts=options['carts'],
+                follows=options['follows'], alpha=options['alpha'],
+                seed=options['seed'],
+                reuse_reference=options['reuse_reference']
+            )
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'generated in {time.perf_counter() - start:.1f}s'
+        ))
@@ -1,33 +1,19 @@
-import csv
-import os
-
-from django.conf import settings
-from django.core.management.base import BaseCommand, CommandError
-
+from recipes.autocomplete import ingredient_index
+from recipes.cache import bump_version
 from recipes.models import Ingredient
+from ._loader import BulkLoadCommand
 
-DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
 
-
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     """
-    Add ingredients from CSV
+    Add ingredients from CSV or JSON
     """
     help = 'loading ingredients from data in json or csv'
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    default_name = 'ingredients'
+    missing_file_message = 'Add ingredients file to dir data'
 
-    def add_arguments(self, parser):
-        parser.add_argument('filename', default='ingredients.csv', nargs='?',
-                            type=str)
-
-    def handle(self, *args, **options):
-        try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as f:
-                data = csv.reader(f)
-                for name, measurement_unit in data:
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-        except FileNotFoundError:
-            raise CommandError('Add ingredients file to dir data')
+    def after_load(self):
+        ingredient_index.invalidate()
+        bump_version('ingredients')
@@ -1,32 +1,17 @@
-import csv
-import os
-
-from django.conf import settings
-from django.core.management.base import BaseCommand, CommandError
+from recipes.cache import bump_version
 from recipes.models import Tag
-
-DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+from ._loader import BulkLoadCommand
 
 
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     """
-    Add tags from CSV
+    Add tags from CSV or JSON
     """
+    help = 'loading tags from data in json or csv'
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    default_name = 'tags'
+    missing_file_message = 'Add tags file to dir data'
 
-    def add_arguments(self, parser):
-        parser.add_argument('filename', default='tags.csv', nargs='?',
-                            type=str)
-
-    def handle(self, *args, **options):
-        try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as f:
-                datareader = csv.reader(f)
-                for name, color, slug in datareader:
-                    Tag.objects.get_or_create(
-                        name=name,
-                        color=color,
-                        slug=slug
-                    )
-        except FileNotFoundError:
-            raise CommandError('Add tags file to dir data')
+    def after_load(self):
+        bump_version('tags')
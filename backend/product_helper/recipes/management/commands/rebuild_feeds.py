@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    """
+    Refill the home feeds from the follows
+    """
+    help = 'rebuild the fanned out home feeds of all users'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            entries = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(f'{entries} feed entries'))
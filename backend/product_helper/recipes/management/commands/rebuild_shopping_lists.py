@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    """
+    Refill the shopping lists from the carts
+    """
+    help = 'rebuild the incrementally kept shopping lists of all users'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            items = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(f'{items} shopping list items'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    """
+    Repair denormalized counters
+    """
+    help = 'recount favorites, carts, recipes and followers counters'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: {rows} fixed')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(fixed.values())} counters repaired'
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 3.2 on 2026-10-18 17:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipes', 'favorites_count', 'recipes', 'Favorite',
+     'recipe'),
+    ('recipes', 'Recipes', 'in_carts_count', 'recipes', 'ShoppingCart',
+     'recipe'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipes', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Follow', 'following'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, counted_app, counted_name, foreign_key in COUNTERS:
+        counted = apps.get_model(counted_app, counted_name)
+        apps.get_model(app, name).objects.update(**{field: Coalesce(
+            Subquery(
+                counted.objects.filter(
+                    **{foreign_key: OuterRef('pk')}
+                ).order_by().values(foreign_key).annotate(
+                    count=Count('*')
+                ).values('count')
+            ), 0
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_hot_path_indexes'),
+        ('users', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='times favorited'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='times in shopping carts'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
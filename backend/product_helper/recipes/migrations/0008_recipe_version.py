@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 17:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='representation version'),
+        ),
+    ]
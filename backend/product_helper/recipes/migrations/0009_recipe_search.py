@@ -0,0 +1,24 @@
+# Generated by Django 3.2 on 2026-10-18 17:35
+
+from django.db import migrations
+
+from recipes.search import drop_search, install_search
+
+
+def install(apps, schema_editor):
+    install_search(schema_editor.connection)
+
+
+def drop(apps, schema_editor):
+    drop_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, drop),
+    ]
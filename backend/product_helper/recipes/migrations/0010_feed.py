@@ -0,0 +1,65 @@
+# Generated by Django 3.2 on 2026-10-18 17:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Follow = apps.get_model('users', 'Follow')
+    Recipes = apps.get_model('recipes', 'Recipes')
+    latest = {}
+
+    def entries():
+        for user_id, author_id in Follow.objects.filter(
+            following__followers_count__lte=settings.FEED_CELEBRITY_FOLLOWERS
+        ).values_list('user_id', 'following_id').iterator():
+            if author_id not in latest:
+                latest[author_id] = list(
+                    Recipes.objects.filter(author_id=author_id).order_by(
+                        '-pub_date', '-id'
+                    ).values_list('id', 'pub_date')[:settings.FEED_BACKFILL]
+                )
+            for recipe_id, pub_date in latest[author_id]:
+                yield FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                                author_id=author_id, pub_date=pub_date)
+
+    FeedEntry.objects.bulk_create(entries(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0009_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='publication date')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='author')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipes', verbose_name='recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='reader')),
+            ],
+            options={
+                'verbose_name': 'feed entry',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique feed entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2 on 2026-10-18 17:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_shopping_lists(apps, schema_editor):
+    RecipesIngredient = apps.get_model('recipes', 'RecipesIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(**row)
+            for row in RecipesIngredient.objects.filter(
+                recipe__carts__isnull=False
+            ).values(
+                'ingredient_id',
+                user_id=F('recipe__carts__user_id'),
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit')
+            ).annotate(
+                total_amount=Coalesce(Sum('amount'), 0),
+                recipes_count=Count('recipe_id')
+            ).order_by().iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='ingredient name')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='measurement unit')),
+                ('total_amount', models.PositiveIntegerField(default=0, verbose_name='total amount')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='recipes count')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient', verbose_name='ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'shopping list item',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistitem',
+            index=models.Index(fields=['user', 'name', 'measurement_unit'], name='shopping_list_user_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique shopping list item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
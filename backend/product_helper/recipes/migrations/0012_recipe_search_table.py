@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-18 18:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import recipes.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_shopping_list'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='recipes.recipes')),
+                ('document', recipes.search.FullTextField(db_column='recipes_recipes_search')),
+            ],
+            options={
+                'db_table': 'recipes_recipes_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 18:09
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+from recipes.images import IMAGE_VARIANTS, variant_name
+
+
+def fill_image_variants(apps, schema_editor):
+    # the last time the storage is asked which variants exist
+    Recipes = apps.get_model('recipes', 'Recipes')
+    for recipe_id, name in Recipes.objects.exclude(image='').values_list(
+        'id', 'image'
+    ).iterator():
+        if all(
+            default_storage.exists(variant_name(name, variant))
+            for variant in IMAGE_VARIANTS
+        ):
+            Recipes.objects.filter(pk=recipe_id).update(
+                image_variants_of=name
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='image_variants_of',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='image with variants'),
+        ),
+        migrations.RunPython(fill_image_variants, migrations.RunPython.noop),
+    ]
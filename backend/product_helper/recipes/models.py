@@ -1,6 +1,8 @@
 from django.db import models
 from users.models import User
 
+from .search import FullTextField
+
 MAX_LENGHT_CONT = 200
 MAX_LENGHT_FOR_COLOR = 7
 
@@ -16,6 +18,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient',
+            ),
+        )
         verbose_name = 'Ingredient'
 
     def __str__(self):
@@ -98,15 +106,68 @@ class Recipes(models.Model):
         blank=True,
         verbose_name='cooking time'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='times favorited'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='times in shopping carts'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='representation version'
+    )
+    # the image whose list/detail/webp variants are all built,
+    # serializers return their urls without asking the storage
+    image_variants_of = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='image with variants'
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
         verbose_name = 'recipe'
 
     def __str__(self):
         return f'{self.author}, {self.name}, {self.text}'
 
 
+class RecipeSearch(models.Model):
+    # the SQLite FTS5 table made by recipes/search.py, joined on
+    # rowid; the column named after the table is the whole row for
+    # MATCH and bm25()
+    recipe = models.OneToOneField(
+        Recipes,
+        primary_key=True,
+        on_delete=models.DO_NOTHING,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_entry'
+    )
+    document = FullTextField(db_column='recipes_recipes_search')
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipes_search'
+
+
 class RecipesIngredient(models.Model):
     ingredient = models.ForeignKey(
         Ingredient,
@@ -130,6 +191,13 @@ class RecipesIngredient(models.Model):
                 name='unique ingredient amount',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient'),
+                include=('amount',),
+                name='recipe_ingredient_amount_idx',
+            ),
+        )
         verbose_name = 'amount ingredient in recipe'
 
     def __str__(self):
@@ -149,6 +217,16 @@ class RecipesTag(models.Model):
     )
 
     class Meta:
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'),
+                name='recipetag_tag_recipe_idx',
+            ),
+            models.Index(
+                fields=('recipe', 'tag'),
+                name='recipetag_recipe_tag_idx',
+            ),
+        )
         verbose_name = 'tags in recipe'
 
     def __str__(self):
@@ -174,6 +252,12 @@ class Favorite(models.Model):
     class Meta:
         ordering = ['-add_date']
         unique_together = ("recipe", 'user')
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'),
+                name='favorite_user_recipe_idx',
+            ),
+        )
         verbose_name = 'favorite'
 
     def __str__(self):
@@ -205,3 +289,102 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user}, {self.recipe}'
+
+
+class FeedEntry(models.Model):
+    # author and pub_date are copied from the recipe, so reading a
+    # feed page and pruning an unfollowed author are index scans
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='reader'
+    )
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='recipe'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='author'
+    )
+    pub_date = models.DateTimeField(verbose_name='publication date')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique feed entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx',
+            ),
+        )
+        verbose_name = 'feed entry'
+
+    def __str__(self):
+        return f'{self.user}, {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    # sums of the ingredients of the recipes in a user's cart, name
+    # and unit are copied from the ingredient so a list is read
+    # without joins
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='user'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='ingredient'
+    )
+    name = models.CharField(
+        max_length=MAX_LENGHT_CONT,
+        verbose_name='ingredient name'
+    )
+    measurement_unit = models.CharField(
+        max_length=MAX_LENGHT_CONT,
+        verbose_name='measurement unit'
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='total amount'
+    )
+    # the item is dropped when no recipe in the cart needs it
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='recipes count'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique shopping list item',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'name', 'measurement_unit'),
+                name='shopping_list_user_name_idx',
+            ),
+        )
+        verbose_name = 'shopping list item'
+
+    def __str__(self):
+        return f'{self.user}, {self.name}, {self.total_amount}'
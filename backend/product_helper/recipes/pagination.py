@@ -1,5 +1,147 @@
-from rest_framework.pagination import PageNumberPagination
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+from .feed import after, before, feed_page
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Keyset pagination. DRF's cursor only holds the first ordering
+    field, which has to be unique.
+    """
+    page_size_query_param = 'limit'
+    ordering = ('-id',)
+
+
+class PubDateCursorPagination(CursorPagination):
+    """
+    Keyset pagination of recipes newest first. The cursor holds
+    the pub_date and id of the recipe at the edge of the page, so
+    recipes published at the same time are neither skipped nor
+    shown twice.
+    """
+    page_size_query_param = 'limit'
+    next_cursor = previous_cursor = None
+
+    @staticmethod
+    def make_cursor(recipe, reverse=False):
+        return Cursor(
+            offset=0, reverse=reverse,
+            position=f'{recipe.pub_date.isoformat()} {recipe.id}'
+        )
+
+    def decode_position(self, cursor):
+        if cursor is None or cursor.position is None:
+            return None
+        try:
+            pub_date, recipe_id = cursor.position.rsplit(' ', 1)
+            position = parse_datetime(pub_date), int(recipe_id)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return self.encode_cursor(self.next_cursor)
+
+    def get_previous_link(self):
+        if self.previous_cursor is None:
+            return None
+        return self.encode_cursor(self.previous_cursor)
+
+
+class RecipeCursorPagination(PubDateCursorPagination):
+    """
+    Keyset pages of the recipe list, in both directions
+    """
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+        position = self.decode_position(cursor)
+        backwards = position is not None and cursor.reverse
+        if backwards:
+            queryset = before(queryset, position, 'id').order_by(
+                'pub_date', 'id'
+            )
+        else:
+            queryset = after(queryset, position, 'id').order_by(
+                *self.ordering
+            )
+        recipes = list(queryset[:self.page_size + 1])
+        page = recipes[:self.page_size]
+        more = len(recipes) > len(page)
+        if backwards:
+            page.reverse()
+        has_next = position is not None if backwards else more
+        has_previous = more if backwards else position is not None
+        self.next_cursor = self.previous_cursor = None
+        if page and has_next:
+            self.next_cursor = self.make_cursor(page[-1])
+        if page and has_previous:
+            self.previous_cursor = self.make_cursor(page[0], reverse=True)
+        return page
+
+
+class CursorOrPageNumberPagination(CustomPageNumberPagination):
+    """
+    Page numbers by default, keyset pagination once a client
+    passes `?cursor=` (empty for the first page). Search results
+    are ordered by relevance, which a cursor can't keep, so they
+    are only paged by number.
+    """
+    cursor_pagination_class = RecipeCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param in request.query_params:
+            if 'search_rank' in queryset.query.annotations:
+                raise ValidationError({
+                    cursor_param: 'Search results are paged with '
+                                  '?page=, not with a cursor.'
+                })
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(PubDateCursorPagination):
+    """
+    Keyset pages of the home feed, there are no previous pages
+    """
+    page_size = 10
+    max_page_size = 100
+
+    def paginate_feed(self, user, request):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        recipes = feed_page(
+            user, self.page_size + 1,
+            self.decode_position(self.decode_cursor(request))
+        )
+        page = recipes[:self.page_size]
+        self.next_cursor = None
+        if len(recipes) > len(page):
+            self.next_cursor = self.make_cursor(page[-1])
+        return page
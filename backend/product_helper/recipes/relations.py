@@ -0,0 +1,26 @@
+from .cache import bump_version, user_namespace
+from .counters import update_counters_many
+from .models import ShoppingCart
+from .shopping_list import add_to_list, pdf_cache, remove_from_list
+
+
+def relations_changed(model, user_id, recipe_ids, delta):
+    """
+    Everything but the write itself when a user adds (`delta` 1)
+    or removes (-1) favorites or cart rows: counters, shopping
+    list and cached per-user state. The single row receivers and
+    the batch endpoints both go through here.
+    """
+    update_counters_many(
+        model,
+        [model(user_id=user_id, recipe_id=recipe_id)
+         for recipe_id in recipe_ids],
+        delta
+    )
+    if model is ShoppingCart:
+        if delta > 0:
+            add_to_list(user_id, recipe_ids)
+        else:
+            remove_from_list(user_id, recipe_ids)
+        pdf_cache.invalidate_user(user_id)
+    bump_version(user_namespace(user_id))
@@ -0,0 +1,189 @@
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Lookup, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+
+RECIPES_TABLE = 'recipes_recipes'
+SEARCH_TABLE = 'recipes_recipes_search'
+SQLITE_TRIGGERS = ('recipes_search_insert', 'recipes_search_delete',
+                   'recipes_search_update')
+MAX_TERMS = 10
+TERM = re.compile(r'[^\W_]+')
+# a word in the name counts more than one in the description,
+# ts_rank() only takes weights within [0, 1]
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({row}text, '')), 'B')"
+)
+
+POSTGRES_INSTALL = (
+    f'ALTER TABLE {RECIPES_TABLE} '
+    f'ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f'''CREATE OR REPLACE FUNCTION recipes_search_vector() RETURNS trigger
+    AS $$
+    BEGIN
+        NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql''',
+    f'DROP TRIGGER IF EXISTS recipes_search_vector ON {RECIPES_TABLE}',
+    f'''CREATE TRIGGER recipes_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON {RECIPES_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION recipes_search_vector()''',
+    f'UPDATE {RECIPES_TABLE} SET search_vector = '
+    f'{SEARCH_VECTOR.format(row="")}',
+    f'CREATE INDEX IF NOT EXISTS recipes_search_vector_gin '
+    f'ON {RECIPES_TABLE} USING gin (search_vector)',
+)
+POSTGRES_DROP = (
+    'DROP INDEX IF EXISTS recipes_search_vector_gin',
+    f'DROP TRIGGER IF EXISTS recipes_search_vector ON {RECIPES_TABLE}',
+    'DROP FUNCTION IF EXISTS recipes_search_vector()',
+    f'ALTER TABLE {RECIPES_TABLE} DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_INSERT = (
+    f'INSERT INTO {SEARCH_TABLE}(rowid, name, text) '
+    f'VALUES (new.id, new.name, new.text);'
+)
+SQLITE_DELETE = (
+    f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, text) '
+    f"VALUES ('delete', old.id, old.name, old.text);"
+)
+SQLITE_SYNC = (
+    f'''CREATE TRIGGER IF NOT EXISTS recipes_search_insert
+    AFTER INSERT ON {RECIPES_TABLE} BEGIN {SQLITE_INSERT} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS recipes_search_delete
+    AFTER DELETE ON {RECIPES_TABLE} BEGIN {SQLITE_DELETE} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS recipes_search_update
+    AFTER UPDATE OF name, text ON {RECIPES_TABLE}
+    BEGIN {SQLITE_DELETE} {SQLITE_INSERT} END''',
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+)
+SQLITE_INSTALL = (
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, text, content='{RECIPES_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )''',
+    *SQLITE_SYNC,
+)
+SQLITE_DROP = (
+    *(f'DROP TRIGGER IF EXISTS {trigger}' for trigger in SQLITE_TRIGGERS),
+    f'DROP TABLE IF EXISTS {SEARCH_TABLE}',
+)
+
+
+class FullTextField(TextField):
+    """
+    Hidden FTS5 column that stands for the whole row.
+    """
+
+
+@FullTextField.register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def run(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install_search(connection):
+    """
+    Full-text index of recipe names and descriptions, kept up to
+    date by triggers so bulk writes are indexed too: a weighted
+    tsvector column with a GIN index on Postgres, an external
+    content FTS5 table on SQLite. Other databases fall back to
+    `icontains`.
+    """
+    run(connection, {
+        'postgresql': POSTGRES_INSTALL,
+        'sqlite': SQLITE_INSTALL,
+    }.get(connection.vendor, ()))
+
+
+def drop_search(connection):
+    run(connection, {
+        'postgresql': POSTGRES_DROP,
+        'sqlite': SQLITE_DROP,
+    }.get(connection.vendor, ()))
+
+
+def repair_search(connection):
+    """
+    SQLite migrations rebuild a table to alter it, which drops its
+    triggers. Put them back and reindex if the FTS table is there.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            ('recipes_%',)
+        )
+        names = {name for name, in cursor.fetchall()}
+    if SEARCH_TABLE in names and not names.issuperset(SQLITE_TRIGGERS):
+        run(connection, SQLITE_SYNC)
+
+
+def postgres_rank(tsquery):
+    # weights of the D, C, B (text) and A (name) labels
+    return RawSQL(
+        f'ts_rank(%s::float4[], {RECIPES_TABLE}.search_vector, '
+        f"to_tsquery('simple', %s))",
+        ([0, 0, TEXT_WEIGHT, NAME_WEIGHT], tsquery),
+        output_field=FloatField()
+    )
+
+
+def search_recipes(queryset, query):
+    """
+    Recipes having every word of the query as a word prefix in the
+    name or description, the most relevant first.
+    """
+    terms = TERM.findall(query.lower())[:MAX_TERMS]
+    if not terms:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        matches = RawSQL(
+            f'SELECT id FROM {RECIPES_TABLE} '
+            f"WHERE search_vector @@ to_tsquery('simple', %s)",
+            (tsquery,)
+        )
+        rank = postgres_rank(tsquery)
+    elif vendor == 'sqlite':
+        # joined rather than a subquery per recipe, MATCH and bm25()
+        # run once and the FTS table drives the join
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(search_entry__document__match=match).annotate(
+            # bm25() is lower for better matches
+            search_rank=Func(
+                F('search_entry__document'), Value(NAME_WEIGHT),
+                Value(TEXT_WEIGHT), function='bm25',
+                output_field=FloatField()
+            ) * Value(-1.0)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(text__icontains=term)
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+    return queryset.filter(id__in=matches).annotate(
+        search_rank=rank
+    ).order_by('-search_rank', '-pub_date', '-id')
@@ -1,25 +1,58 @@
 import base64
+import hashlib
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
 from users.serializers import CustomUserSerializer, ShortRecipeSerializer
+from .cache import cache_recipe, get_cached_recipes
+from .images import MAX_IMAGE_SIZE, schedule_variants, variant_urls
 from .models import (Favorite, Ingredient, Recipes, RecipesIngredient,
-                     ShoppingCart, Tag)
+                     RecipesTag, ShoppingCart, Tag)
+from .shopping_list import ingredients_changed
+from .viewer import get_viewer
 
 User = get_user_model()
 
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch(
+        'recipesingredient_set',
+        queryset=RecipesIngredient.objects.select_related('ingredient')
+    ),
+)
+MAX_BATCH_RECIPES = 100
+
 
 class Base64ImageField(serializers.ImageField):
     """
     Image Serializer.
+    Payload size is checked before decoding, files are named
+    by a hash of their content.
     """
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            size = len(imgstr) * 3 // 4 - imgstr[-2:].count('=')
+            if size > MAX_IMAGE_SIZE:
+                raise serializers.ValidationError(
+                    f'Image should not be larger than {MAX_IMAGE_SIZE} bytes'
+                )
+            content = base64.b64decode(imgstr)
+            name = hashlib.sha256(content).hexdigest()[:32]
+            image = super().to_internal_value(
+                ContentFile(content, name=f'{name}.{ext}')
+            )
+            # the same content was uploaded before, saving it again
+            # would only store a copy under a suffixed name
+            if default_storage.exists(image.name):
+                return image.name
+            return image
 
         return super().to_internal_value(data)
 
@@ -91,7 +124,7 @@ class AddIngredientSerializer(serializers.ModelSerializer):
     """
     Serializer for adding Ingredients to Recipe.
     """
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -99,52 +132,101 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    """
+    List of recipes with the shared part read from the cache
+    in one round trip, only cache misses are prefetched.
+    """
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        shared = get_cached_recipes(recipe.id for recipe in recipes)
+        missing = [recipe for recipe in recipes if recipe.id not in shared]
+        if missing:
+            prefetch_related_objects(missing, *RECIPE_PREFETCH)
+        return [
+            self.child.represent(recipe, shared.get(recipe.id))
+            for recipe in recipes
+        ]
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
     """
-    Serializer to display recipes
+    Serializer to display recipes.
+    Everything but the per-user flags is the same for every
+    user and is cached per recipe.
     """
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField(read_only=True)
+    ingredients = RecipeIngredientSerializer(
+        source='recipesingredient_set', many=True, read_only=True
+    )
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Recipes
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text', 'cooking_time')
+        list_serializer_class = CachedRecipeListSerializer
+
+    def to_representation(self, instance):
+        shared = get_cached_recipes([instance.id]).get(instance.id)
+        return self.represent(instance, shared)
+
+    def represent(self, instance, shared):
+        if shared is None:
+            shared = self.shared_representation(instance)
+            cache_recipe(instance.id, shared)
+        data = dict(
+            shared,
+            is_favorited=self.get_is_favorited(instance),
+            is_in_shopping_cart=self.get_is_in_shopping_cart(instance)
+        )
+        data['author'] = dict(
+            shared['author'],
+            is_subscribed=self.fields['author'].get_is_subscribed(
+                instance.author
+            )
+        )
+        request = self.context.get('request')
+        if request and data['image']:
+            data['image'] = request.build_absolute_uri(data['image'])
+            data['image_variants'] = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in data.get('image_variants', {}).items()
+            }
+        return data
 
-    def get_ingredients(self, obj):
-        queryset = RecipesIngredient.objects.filter(recipe=obj)
-        return [{'id': item.id, 'name': item.ingredient.name,
-                 'measurement_unit': item.ingredient.measurement_unit,
-                 'amount': item.amount} for item in queryset]
+    def shared_representation(self, instance):
+        prefetch_related_objects([instance], *RECIPE_PREFETCH)
+        data = super().to_representation(instance)
+        data['image'] = instance.image.url if instance.image else None
+        return data
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj)
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        if not request:
             return False
-        return Favorite.objects.filter(user=request.user, recipe=obj).exists()
+        return get_viewer(request).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        if not request:
             return False
-        return ShoppingCart.objects.filter(
-            user=request.user,
-            recipe=obj
-        ).exists()
+        return get_viewer(request).is_in_shopping_cart(obj.id)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """
     Adding Recipe Serializers.
     """
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = AddIngredientSerializer(many=True)
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField(required=False, allow_null=True)
@@ -156,6 +238,28 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                   'image', 'name',
                   'text', 'cooking_time')
 
+    @staticmethod
+    def get_objects(model, ids):
+        objects = model.objects.in_bulk(ids)
+        missing = sorted(set(ids) - objects.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f'{model._meta.verbose_name} ids {missing} do not exist'
+            )
+        return objects
+
+    def validate_tags(self, tags):
+        objects = self.get_objects(Tag, tags)
+        return [objects[tag] for tag in tags]
+
+    def validate_ingredients(self, ingredients):
+        objects = self.get_objects(
+            Ingredient, [ingredient['id'] for ingredient in ingredients]
+        )
+        for ingredient in ingredients:
+            ingredient['id'] = objects[ingredient['id']]
+        return ingredients
+
     def validate(self, data):
         ingredients = data['ingredients']
         ingredients_list = []
@@ -192,24 +296,87 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+        RecipesTag.objects.bulk_create(
+            RecipesTag(recipe=recipe, tag=tag) for tag in tags
+        )
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
-        for ingredient in ingredients:
-            RecipesIngredient.objects.create(
+        RecipesIngredient.objects.bulk_create(
+            RecipesIngredient(
                 recipe=recipe, ingredient=ingredient['id'],
                 amount=ingredient['amount']
+            ) for ingredient in ingredients
+        )
+
+    @staticmethod
+    def update_tags(tags, recipe):
+        current = set(
+            RecipesTag.objects.filter(recipe=recipe).values_list(
+                'tag_id', flat=True
             )
+        )
+        new = {tag.id for tag in tags}
+        if current - new:
+            RecipesTag.objects.filter(
+                recipe=recipe, tag_id__in=current - new
+            ).delete()
+        RecipesTag.objects.bulk_create(
+            RecipesTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new - current
+        )
 
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        current = {
+            item.ingredient_id: item
+            for item in RecipesIngredient.objects.filter(recipe=recipe)
+        }
+        new = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - new.keys()
+        changes = {
+            ingredient_id: (-(current[ingredient_id].amount or 0), -1)
+            for ingredient_id in removed
+        }
+        if removed:
+            RecipesIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in new.items():
+            item = current.get(ingredient_id)
+            if item is None:
+                changes[ingredient_id] = (amount, 1)
+            elif item.amount != amount:
+                changes[ingredient_id] = (amount - (item.amount or 0), 0)
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipesIngredient.objects.bulk_update(changed, ('amount',))
+        RecipesIngredient.objects.bulk_create(
+            RecipesIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new.items()
+            if ingredient_id not in current
+        )
+        # bulk writes send no signals, the shopping lists of carts
+        # holding the recipe are brought up to date here
+        ingredients_changed(recipe.id, changes)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        RecipesIngredient.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        return super().update(instance, validated_data)
-
+        self.update_tags(validated_data.pop('tags'), instance)
+        self.update_ingredients(validated_data.pop('ingredients'), instance)
+        instance = super().update(instance, validated_data)
+        if validated_data.get('image'):
+            schedule_variants(instance)
+        return instance
+
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
@@ -217,6 +384,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipes.objects.create(author=author, **validated_data)
         self.create_tags(tags, recipe)
         self.create_ingredients(ingredients, recipe)
+        schedule_variants(recipe)
         return recipe
 
     def to_representation(self, instance):  # -
@@ -238,3 +406,27 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         context = {'request': request}
         return ShortRecipeSerializer(
             instance.recipe, context=context).data
+
+
+class ShoppingListItemSerializer(serializers.Serializer):
+    """
+    Serializer for shopping list items, read from `get_shopping_list`
+    """
+    id = serializers.IntegerField(source='ingredient_id')
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.IntegerField(source='total_amount')
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of recipe ids, repeated ids are dropped
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_RECIPES
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,307 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .models import (Ingredient, RecipesIngredient, ShoppingCart,
+                     ShoppingListItem)
+
+FONT_PATH = os.path.join(settings.BASE_DIR, 'data', 'Handicraft.ttf')
+PAGE_TOP = 800
+PAGE_BOTTOM = 50
+LINE_HEIGHT = 25
+BATCH_SIZE = 1000
+
+_font_lock = threading.Lock()
+_fonts_registered = False
+
+
+def register_fonts():
+    """
+    Register the PDF fonts once per process.
+    """
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    with _font_lock:
+        if not _fonts_registered:
+            pdfmetrics.registerFont(TTFont('Handicraft', FONT_PATH, 'UTF-8'))
+            _fonts_registered = True
+
+
+class DocumentCache:
+    """
+    Size-bounded LRU cache of rendered shopping lists.
+    Documents are keyed by a digest of the list contents and
+    the last digest served to every user is remembered, so the
+    document can be dropped once that user's cart changes. A
+    document keeps the users it was served to, they are forgotten
+    with it when it is evicted.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        # digest -> (document, ids of the users it was served to)
+        self._documents = OrderedDict()
+        self._user_digests = {}
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._documents.get(digest)
+            if entry is None:
+                return None
+            self._documents.move_to_end(digest)
+            return entry[0]
+
+    def set(self, user_id, digest, document):
+        with self._lock:
+            previous = self._user_digests.get(user_id)
+            if previous != digest and previous in self._documents:
+                self._documents[previous][1].discard(user_id)
+            entry = self._documents.get(digest)
+            users = entry[1] if entry is not None else set()
+            users.add(user_id)
+            self._user_digests[user_id] = digest
+            self._documents[digest] = (document, users)
+            self._documents.move_to_end(digest)
+            while len(self._documents) > self.max_size:
+                self._forget(*self._documents.popitem(last=False))
+
+    def _forget(self, digest, entry):
+        for user_id in entry[1]:
+            if self._user_digests.get(user_id) == digest:
+                del self._user_digests[user_id]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            digest = self._user_digests.pop(user_id, None)
+            entry = self._documents.pop(digest, None)
+            if entry is not None:
+                self._forget(digest, entry)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._user_digests.clear()
+
+
+pdf_cache = DocumentCache(
+    getattr(settings, 'SHOPPING_LIST_CACHE_SIZE', 128)
+)
+
+
+def _delta(changes, position):
+    return Case(
+        *(When(ingredient_id=ingredient_id, then=Value(delta[position]))
+          for ingredient_id, delta in changes.items()),
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def change_lists(user_ids, changes):
+    """
+    Add `{ingredient_id: (amount, recipes)}` deltas to the shopping
+    lists of the users, `user_ids` may be a subquery. Missing items
+    are created first, all items are then changed by one UPDATE and
+    the ones no recipe needs any more are dropped.
+    """
+    changes = {
+        ingredient_id: delta
+        for ingredient_id, delta in changes.items() if any(delta)
+    }
+    if not changes:
+        return
+    added = [
+        ingredient_id
+        for ingredient_id, (_, recipes) in changes.items() if recipes > 0
+    ]
+    if added:
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                                 name=name, measurement_unit=unit)
+                for ingredient_id, name, unit in Ingredient.objects.filter(
+                    id__in=added
+                ).values_list('id', 'name', 'measurement_unit')
+                for user_id in user_ids
+            ),
+            batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=changes
+    )
+    items.update(
+        total_amount=F('total_amount') + _delta(changes, 0),
+        recipes_count=F('recipes_count') + _delta(changes, 1)
+    )
+    if any(recipes < 0 for _, recipes in changes.values()):
+        items.filter(recipes_count=0).delete()
+
+
+def recipe_changes(recipe_ids, sign):
+    return {
+        ingredient_id: (sign * amount, sign * recipes)
+        for ingredient_id, amount, recipes in RecipesIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id').annotate(
+            amount=Coalesce(Sum('amount'), 0), recipes=Count('recipe_id')
+        ).values_list('ingredient_id', 'amount', 'recipes').order_by()
+    }
+
+
+def add_to_list(user_id, recipe_ids):
+    change_lists([user_id], recipe_changes(recipe_ids, 1))
+
+
+def remove_from_list(user_id, recipe_ids):
+    change_lists([user_id], recipe_changes(recipe_ids, -1))
+
+
+def ingredients_changed(recipe_id, changes):
+    """
+    Apply an edit of a recipe's ingredients to the lists of every
+    user having the recipe in the cart.
+    """
+    if changes:
+        change_lists(
+            ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+                'user_id', flat=True
+            ),
+            changes
+        )
+
+
+def rename_ingredient(ingredient):
+    ShoppingListItem.objects.filter(ingredient=ingredient).exclude(
+        name=ingredient.name, measurement_unit=ingredient.measurement_unit
+    ).update(name=ingredient.name,
+             measurement_unit=ingredient.measurement_unit)
+
+
+def rebuild_shopping_lists():
+    """
+    Sum the carts up again from scratch, for data written without
+    signals or lists that drifted. Returns the number of items.
+    """
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(**row)
+            for row in RecipesIngredient.objects.filter(
+                recipe__carts__isnull=False
+            ).values(
+                'ingredient_id',
+                user_id=F('recipe__carts__user_id'),
+                name=F('ingredient__name'),
+                measurement_unit=F('ingredient__measurement_unit')
+            ).annotate(
+                total_amount=Coalesce(Sum('amount'), 0),
+                recipes_count=Count('recipe_id')
+            ).order_by().iterator()
+        ),
+        batch_size=BATCH_SIZE
+    )
+    return ShoppingListItem.objects.count()
+
+
+def get_shopping_list(user):
+    """
+    The user's shopping list as kept up to date in
+    `ShoppingListItem`, one row per ingredient, so equal names
+    with different measurement units are kept apart.
+    """
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient_id', 'name', 'measurement_unit', 'total_amount'
+    ).order_by('name', 'measurement_unit')
+
+
+def _rows(items):
+    for item in items:
+        yield item['name'], item['measurement_unit'], item['total_amount']
+
+
+class Echo:
+    """
+    File-like object that hands written lines back to the caller.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in _rows(items):
+        yield writer.writerow(row)
+
+
+def iter_txt(items):
+    yield 'Shopping list\n\n'
+    for i, (name, unit, amount) in enumerate(_rows(items), 1):
+        yield f'{i}. {name} - {amount} {unit}\n'
+
+
+def iter_json(items):
+    yield '['
+    for i, (name, unit, amount) in enumerate(_rows(items)):
+        yield (',' if i else '') + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False
+        )
+    yield ']'
+
+
+def get_digest(rows):
+    return hashlib.sha256(
+        json.dumps(rows, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+
+def get_cached_pdf(user, items):
+    """
+    PDF for the user's shopping list, rendered only when
+    a list with the same contents is not cached yet.
+    """
+    rows = list(_rows(items))
+    digest = get_digest(rows)
+    document = pdf_cache.get(digest)
+    if document is None:
+        document = render_pdf(rows)
+    pdf_cache.set(user.id, digest, document)
+    return document
+
+
+def render_pdf(rows):
+    """
+    Shopping list as a PDF document, continued on new pages
+    when a page is full.
+    """
+    register_fonts()
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    page.setFont('Helvetica', size=30)
+    page.drawString(200, PAGE_TOP, 'Shopping list')
+    page.setFont('Handicraft', size=20)
+    height = PAGE_TOP - 2 * LINE_HEIGHT
+    for i, (name, unit, amount) in enumerate(rows, 1):
+        if height < PAGE_BOTTOM:
+            page.showPage()
+            page.setFont('Handicraft', size=20)
+            height = PAGE_TOP
+        page.drawString(75, height, f'{i}. {name} - {amount} {unit}')
+        height -= LINE_HEIGHT
+    page.showPage()
+    page.save()
+    return buffer.getvalue()
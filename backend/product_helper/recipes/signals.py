@@ -0,0 +1,122 @@
+from django.db import connections
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from users.models import Follow, User
+from .autocomplete import ingredient_index
+from .cache import bump_version, touch_recipes, user_namespace
+from .counters import update_counters
+from .feed import fan_out, follow, unfollow
+from .models import (Favorite, Ingredient, Recipes, RecipesIngredient,
+                     RecipesTag, ShoppingCart, Tag)
+from .relations import relations_changed
+from .search import repair_search
+from .shopping_list import rename_ingredient
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_added(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        relations_changed(sender, instance.user_id, [instance.recipe_id], 1)
+
+
+@receiver(pre_delete, sender=Favorite)
+@receiver(pre_delete, sender=ShoppingCart)
+def relation_removed(sender, instance, **kwargs):
+    # before the delete, a deleted recipe may lose its ingredients
+    # ahead of its carts
+    relations_changed(sender, instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def touch_follows(sender, instance, **kwargs):
+    bump_version(user_namespace(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    ingredient_index.invalidate()
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def rename_shopping_list_items(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        rename_ingredient(instance)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete), sender=Recipes)
+def invalidate_recipe(sender, instance, **kwargs):
+    touch_recipes([instance.id])
+
+
+@receiver((post_save, post_delete), sender=RecipesIngredient)
+@receiver((post_save, post_delete), sender=RecipesTag)
+def invalidate_recipe_relation(sender, instance, **kwargs):
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=RecipesIngredient)
+@receiver(m2m_changed, sender=RecipesTag)
+def invalidate_recipe_m2m(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch_recipes([instance.pk])
+    elif pk_set:
+        touch_recipes(pk_set)
+    else:
+        bump_version('tags' if sender is RecipesTag else 'ingredients')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    touch_recipes(
+        instance.recipes.values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_save, sender=Follow)
+def count_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        update_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipes)
+@receiver(post_delete, sender=Follow)
+def count_deleted(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipes)
+def push_to_feeds(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        follow(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    unfollow(instance.user_id, instance.following_id)
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        repair_search(connections[using])
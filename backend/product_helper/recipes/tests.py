@@ -0,0 +1,877 @@
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.apps import apps
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from users.models import Follow, User
+from .admin import RecipesIngredientAdmin
+from .autocomplete import IngredientIndex
+from .batch import ADDED, ALREADY_ADDED, NOT_ADDED, NOT_FOUND, REMOVED
+from .cache import bump_version
+from .counters import recount
+from .images import IMAGE_VARIANTS, _process, variant_name
+from .management.commands.explain_queries import seq_scans
+from .models import (Favorite, FeedEntry, Ingredient, Recipes,
+                     RecipesIngredient, RecipesTag, ShoppingCart,
+                     ShoppingListItem, Tag)
+from .search import (SEARCH_TABLE, SQLITE_TRIGGERS, postgres_rank, run,
+                     search_recipes)
+from .shopping_list import DocumentCache, rebuild_shopping_lists
+from .signals import repair_search_index
+
+
+class RecipeQueryBudgetTest(TestCase):
+    """
+    The recipe list and detail take as many queries for one row
+    as for a full page.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader'
+        )
+        cls.author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+        Follow.objects.create(user=cls.user, following=cls.author)
+        cls.tags = [
+            Tag.objects.create(name=f'tag{i}', slug=f'tag{i}',
+                               color=f'#00000{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{i}',
+                                      measurement_unit='g')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def create_recipe(self, i, size=1):
+        recipe = Recipes.objects.create(
+            author=self.author, name=f'recipe{i}', text='text',
+            cooking_time=10
+        )
+        for tag in self.tags[:size]:
+            RecipesTag.objects.create(recipe=recipe, tag=tag)
+        for ingredient in self.ingredients[:size]:
+            RecipesIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=10
+            )
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        return recipe
+
+    def queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_same_queries(self, url, expected):
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        url = reverse('recipe-list') + '?limit=6'
+        self.create_recipe(0)
+        expected = self.queries(url)
+        for i in range(1, 6):
+            self.create_recipe(i, size=3)
+        response = self.assert_same_queries(url, expected)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertTrue(all(
+            recipe['is_favorited'] and recipe['is_in_shopping_cart']
+            and recipe['author']['is_subscribed']
+            for recipe in response.data['results']
+        ))
+
+    def test_detail(self):
+        small = self.create_recipe(0)
+        expected = self.queries(reverse('recipe-detail', args=[small.id]))
+        large = self.create_recipe(1, size=5)
+        response = self.assert_same_queries(
+            reverse('recipe-detail', args=[large.id]), expected
+        )
+        self.assertEqual(len(response.data['ingredients']), 5)
+
+
+class SearchWeightsTest(SimpleTestCase):
+    """
+    Postgres ts_rank() rejects weights above 1.
+    """
+    def test_postgres_weights(self):
+        sql, params = postgres_rank('soup:*').as_sql(None, None)
+        weights, query = params
+        self.assertIn('ts_rank(%s::float4[]', sql)
+        self.assertEqual(query, 'soup:*')
+        self.assertTrue(all(0 <= weight <= 1.0 for weight in weights))
+        # labels D, C, B (text), A (name)
+        self.assertGreater(weights[3], weights[2])
+
+
+class SeqScansTest(TestCase):
+    """
+    What `explain_queries` counts as a sequential scan.
+    """
+    def test_sqlite_plans(self):
+        self.assertEqual(seq_scans('sqlite', 'SCAN recipes_recipes'),
+                         ['recipes_recipes'])
+        self.assertEqual(seq_scans(
+            'sqlite', 'SCAN recipes_recipes USING INDEX recipe_idx'
+        ), [])
+        self.assertEqual(seq_scans(
+            'sqlite',
+            'SCAN recipes_recipes USING INDEX recipe_idx\n'
+            'USE TEMP B-TREE FOR ORDER BY'
+        ), ['recipes_recipes'])
+        self.assertEqual(seq_scans(
+            'sqlite',
+            f'SCAN {SEARCH_TABLE} VIRTUAL TABLE INDEX 0:M2\n'
+            'SEARCH recipes_recipes USING INTEGER PRIMARY KEY (rowid=?)\n'
+            'USE TEMP B-TREE FOR ORDER BY'
+        ), [])
+
+    def test_search_plan(self):
+        plan = search_recipes(Recipes.objects.all(), 'soup').explain()
+        self.assertNotIn(SEARCH_TABLE, seq_scans(connection.vendor, plan))
+
+
+class RecipeSearchTest(TestCase):
+    """
+    Full-text search of the recipe list.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def create_recipe(self, name, text='text'):
+        return Recipes.objects.create(
+            author=self.author, name=name, text=text, cooking_time=10
+        )
+
+    def search(self, query):
+        response = self.client.get(
+            reverse('recipe-list'), {'search': query, 'limit': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_name_ranks_above_text(self):
+        self.create_recipe('Tomato soup', 'Boil the tomatoes')
+        self.create_recipe('Omelette', 'Beat the eggs')
+        # newer, would come first without the rank
+        self.create_recipe('Dinner', 'Serve with a bowl of soup')
+        self.assertEqual(self.search('soup'), ['Tomato soup', 'Dinner'])
+
+    def test_languages(self):
+        self.create_recipe('Борщ украинский', 'Свёкла, капуста и мясо')
+        self.create_recipe('Pancakes', 'Flour, milk and eggs')
+        self.assertEqual(self.search('БОРЩ'), ['Борщ украинский'])
+        self.assertEqual(self.search('борщ капус'), ['Борщ украинский'])
+        self.assertEqual(self.search('pan'), ['Pancakes'])
+        self.assertEqual(self.search('MILK flour'), ['Pancakes'])
+        self.assertEqual(self.search('борщ milk'), [])
+
+    def test_index_follows_writes(self):
+        recipe = self.create_recipe('Pancakes')
+        self.assertEqual(self.search('pancakes'), ['Pancakes'])
+        recipe.name = 'Waffles'
+        recipe.save()
+        self.assertEqual(self.search('pancakes'), [])
+        self.assertEqual(self.search('waffles'), ['Waffles'])
+        recipe.delete()
+        self.assertEqual(self.search('waffles'), [])
+
+    def test_repair_after_migrate(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('only SQLite loses the triggers')
+        # what a SQLite table rebuild by a migration does
+        run(connection, [
+            f'DROP TRIGGER {trigger}' for trigger in SQLITE_TRIGGERS
+        ])
+        self.create_recipe('Pancakes')
+        self.assertEqual(self.search('pancakes'), [])
+        repair_search_index(
+            sender=apps.get_app_config('recipes'), using=DEFAULT_DB_ALIAS
+        )
+        self.assertEqual(self.search('pancakes'), ['Pancakes'])
+        self.create_recipe('Waffles')
+        self.assertEqual(self.search('waffles'), ['Waffles'])
+
+
+class DenormalizedStateTest(TestCase):
+    """
+    Counters and shopping lists kept up to date on every write
+    match the ones recounted from scratch.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader'
+        )
+        cls.author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+        cls.tag = Tag.objects.create(name='tag', slug='tag', color='#000000')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{i}',
+                                      measurement_unit='g')
+            for i in range(4)
+        ]
+        cls.recipes = []
+        for i in range(3):
+            recipe = Recipes.objects.create(
+                author=cls.author, name=f'recipe{i}', text='text',
+                cooking_time=10
+            )
+            RecipesTag.objects.create(recipe=recipe, tag=cls.tag)
+            for ingredient in cls.ingredients[i:i + 2]:
+                RecipesIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10 * (i + 1)
+                )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def assert_no_drift(self):
+        fields = ('user_id', 'ingredient_id', 'name', 'measurement_unit',
+                  'total_amount', 'recipes_count')
+        items = set(ShoppingListItem.objects.values_list(*fields))
+        rebuild_shopping_lists()
+        self.assertEqual(
+            set(ShoppingListItem.objects.values_list(*fields)), items
+        )
+        self.assertEqual(
+            {counter: rows for counter, rows in recount().items() if rows},
+            {}
+        )
+
+    def batch(self, name, method, recipe_ids):
+        response = getattr(self.client, method)(
+            reverse(name), {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['status'] for item in response.data]
+
+    def fill_cart(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.batch('recipe-favorite-batch', 'post', ids)
+        self.batch('recipe-shopping-cart-batch', 'post', ids)
+
+    def test_batch(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        missing = third + 1
+        for name in ('recipe-favorite-batch', 'recipe-shopping-cart-batch'):
+            self.assertEqual(
+                self.batch(name, 'post', [first, second, missing]),
+                [ADDED, ADDED, NOT_FOUND]
+            )
+            self.assertEqual(
+                self.batch(name, 'post', [second, third]),
+                [ALREADY_ADDED, ADDED]
+            )
+        self.assertEqual(Recipes.objects.get(pk=second).in_carts_count, 1)
+        self.assertTrue(ShoppingListItem.objects.filter(user=self.user))
+        self.assert_no_drift()
+        for name in ('recipe-favorite-batch', 'recipe-shopping-cart-batch'):
+            self.assertEqual(
+                self.batch(name, 'delete', [first, second, missing]),
+                [REMOVED, REMOVED, NOT_FOUND]
+            )
+            self.assertEqual(
+                self.batch(name, 'delete', [first, third]),
+                [NOT_ADDED, REMOVED]
+            )
+        self.assertEqual(Recipes.objects.get(pk=third).favorites_count, 0)
+        self.assertFalse(ShoppingListItem.objects.filter(user=self.user))
+        self.assert_no_drift()
+
+    def test_recipe_patch(self):
+        self.fill_cart()
+        recipe = self.recipes[0]
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.patch(
+            reverse('recipe-detail', args=[recipe.id]),
+            {
+                'name': 'recipe', 'text': 'text', 'cooking_time': 5,
+                'tags': [self.tag.id],
+                # one removed, one changed and one added
+                'ingredients': [
+                    {'id': self.ingredients[1].id, 'amount': 25},
+                    {'id': self.ingredients[3].id, 'amount': 5},
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_no_drift()
+
+    def test_admin_delete_queryset(self):
+        self.fill_cart()
+        RecipesIngredientAdmin(RecipesIngredient, admin.site).delete_queryset(
+            RequestFactory().post('/'),
+            RecipesIngredient.objects.filter(recipe__in=self.recipes[:2])
+        )
+        self.assert_no_drift()
+
+    def test_recipe_delete(self):
+        self.fill_cart()
+        author = APIClient()
+        author.force_authenticate(self.author)
+        response = author.delete(
+            reverse('recipe-detail', args=[self.recipes[1].id])
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(User.objects.get(pk=self.author.id).recipes_count, 2)
+        self.assert_no_drift()
+
+
+class RecipeImageTest(TestCase):
+    """
+    Image variants built after the recipe is saved.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+        cls.tag = Tag.objects.create(name='tag', slug='tag', color='#000000')
+        cls.ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='g'
+        )
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        cache.clear()
+
+    @staticmethod
+    def image(color):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (1600, 1000), color).save(buffer, format='PNG')
+        return ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+
+    def create_recipe(self, image):
+        # the test transaction is never committed, the worker job
+        # is not scheduled
+        response = self.client.post(reverse('recipe-list'), {
+            'name': 'recipe', 'text': 'text', 'cooking_time': 10,
+            'tags': [self.tag.id], 'image': image,
+            'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Recipes.objects.get(pk=response.data['id'])
+
+    def variants(self, recipe):
+        response = self.client.get(reverse('recipe-detail', args=[recipe.id]))
+        return response.data['image_variants']
+
+    def test_variants(self):
+        recipe = self.create_recipe(self.image('red'))
+        self.assertEqual(self.variants(recipe), {})
+        # what the worker thread runs once the recipe is committed
+        _process(recipe.id, recipe.image.name)
+        self.assertEqual(self.variants(recipe).keys(), IMAGE_VARIANTS.keys())
+        for variant, (size, image_format, _) in IMAGE_VARIANTS.items():
+            with default_storage.open(
+                variant_name(recipe.image.name, variant)
+            ) as file:
+                image = Image.open(file)
+                self.assertEqual(image.format, image_format)
+                self.assertLessEqual(image.size, size)
+
+    def test_same_image_stored_once(self):
+        image = self.image('blue')
+        first = self.create_recipe(image)
+        _process(first.id, first.image.name)
+        files = sorted(os.listdir(default_storage.location))
+        second = self.create_recipe(image)
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(sorted(os.listdir(default_storage.location)), files)
+        _process(second.id, second.image.name)
+        self.assertEqual(self.variants(second), self.variants(first))
+
+    def test_worker_connections(self):
+        with mock.patch('recipes.images.close_old_connections') as close, \
+                mock.patch('recipes.images._build') as build:
+            _process(1, 'image.png')
+        build.assert_called_once_with(1, 'image.png')
+        self.assertEqual(close.call_count, 2)
+
+
+class ConditionalGetTest(TestCase):
+    """
+    ETag revalidation of recipe lists and details.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader'
+        )
+        cls.other = User.objects.create(
+            email='other@example.com', username='other'
+        )
+        cls.author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+        cls.tag = Tag.objects.create(name='tag', slug='tag', color='#000000')
+        cls.ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='g'
+        )
+        cls.recipe = Recipes.objects.create(
+            author=cls.author, name='recipe', text='text', cooking_time=10
+        )
+        RecipesTag.objects.create(recipe=cls.recipe, tag=cls.tag)
+        RecipesIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('recipe-list'),
+            reverse('recipe-detail', args=[self.recipe.id]),
+        )
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def etags(self, user):
+        client = self.client_for(user)
+        etags = []
+        for url in self.urls:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etags.append(response['ETag'])
+        return etags
+
+    def assert_changes(self, user, action):
+        before = self.etags(user)
+        action()
+        after = self.etags(user)
+        for url, old, new in zip(self.urls, before, after):
+            self.assertNotEqual(old, new, url)
+            response = self.client_for(user).get(url, HTTP_IF_NONE_MATCH=old)
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_not_modified(self):
+        client = self.client_for(self.user)
+        for url, etag in zip(self.urls, self.etags(self.user)):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_viewer_actions(self):
+        client = self.client_for(self.user)
+        for name, kwargs in (
+            ('recipe-favorite', {'args': [self.recipe.id]}),
+            ('recipe-shopping-cart', {'args': [self.recipe.id]}),
+            ('users-subscribe', {'args': [self.author.id]}),
+        ):
+            self.assert_changes(self.user, lambda: self.assertEqual(
+                client.post(reverse(name, **kwargs)).status_code, 201
+            ))
+
+    def test_users_differ(self):
+        for mine, theirs in zip(self.etags(self.user),
+                                self.etags(self.other)):
+            self.assertNotEqual(mine, theirs)
+
+    def test_recipe_patch(self):
+        def patch():
+            response = self.client_for(self.author).patch(
+                reverse('recipe-detail', args=[self.recipe.id]),
+                {
+                    'name': 'new name', 'text': 'text', 'cooking_time': 5,
+                    'tags': [self.tag.id],
+                    'ingredients': [{'id': self.ingredient.id, 'amount': 5}],
+                },
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assert_changes(self.user, patch)
+
+    def test_author_change(self):
+        def rename():
+            self.author.first_name = 'New'
+            self.author.save()
+
+        self.assert_changes(self.user, rename)
+        response = self.client_for(self.user).get(self.urls[1])
+        self.assertEqual(response.data['author']['first_name'], 'New')
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2, FEED_BACKFILL=3)
+class FeedTest(TestCase):
+    """
+    Home feed: entries pushed for regular authors merged with
+    recipes pulled from followed celebrities.
+    """
+    def setUp(self):
+        cache.clear()
+        self.start = timezone.now() - timedelta(days=1)
+        self.reader = self.create_user('reader')
+        self.author = self.create_user('author')
+        self.celebrity = self.create_user('celebrity')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    @staticmethod
+    def create_user(name):
+        return User.objects.create(email=f'{name}@example.com', username=name)
+
+    def create_recipe(self, author, minute):
+        with mock.patch('django.utils.timezone.now',
+                        return_value=self.start + timedelta(minutes=minute)):
+            return Recipes.objects.create(
+                author=author, name='recipe', text='text', cooking_time=10
+            )
+
+    def create_fans(self, count):
+        fans = [self.create_user(f'fan{i}') for i in range(count)]
+        for fan in fans:
+            Follow.objects.create(user=fan, following=self.celebrity)
+        return fans
+
+    def feed(self, limit=10):
+        ids, url = [], reverse('recipe-feed') + f'?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_fan_out(self):
+        Follow.objects.create(user=self.reader, following=self.author)
+        recipe = self.create_recipe(self.author, 1)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, recipe=recipe)
+        )
+        self.assertEqual(self.feed(), [recipe.id])
+
+    def test_backfill_on_follow(self):
+        recipes = [self.create_recipe(self.author, i) for i in range(5)]
+        Follow.objects.create(user=self.reader, following=self.author)
+        self.assertEqual(
+            self.feed(), [recipe.id for recipe in recipes[:-4:-1]]
+        )
+
+    def test_prune_on_unfollow(self):
+        Follow.objects.create(user=self.reader, following=self.author)
+        self.create_recipe(self.author, 1)
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.feed(), [])
+
+    def test_celebrity_pulled(self):
+        self.create_fans(3)
+        Follow.objects.create(user=self.reader, following=self.celebrity)
+        recipe = self.create_recipe(self.celebrity, 1)
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe))
+        self.assertEqual(self.feed(), [recipe.id])
+
+    def test_celebrity_demoted(self):
+        fans = self.create_fans(3)
+        old = self.create_recipe(self.celebrity, 1)
+        Follow.objects.create(user=self.reader, following=self.celebrity)
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader))
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.filter(user__in=fans[:2]).delete()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, recipe=old)
+        )
+        new = self.create_recipe(self.celebrity, 2)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, recipe=new)
+        )
+        self.assertEqual(self.feed(), [new.id, old.id])
+
+    def test_pages(self):
+        self.create_fans(3)
+        Follow.objects.create(user=self.reader, following=self.author)
+        Follow.objects.create(user=self.reader, following=self.celebrity)
+        # pushed and pulled recipes interleaved, some published at
+        # the same time
+        recipes = [
+            self.create_recipe(author, minute)
+            for author, minute in (
+                (self.author, 1), (self.celebrity, 2), (self.author, 3),
+                (self.celebrity, 3), (self.author, 5), (self.celebrity, 5),
+                (self.author, 5), (self.celebrity, 6), (self.author, 7),
+            )
+        ]
+        self.assertEqual(len({recipe.pub_date for recipe in recipes}), 6)
+        expected = [
+            recipe.id for recipe in sorted(
+                recipes, key=lambda recipe: (recipe.pub_date, recipe.id),
+                reverse=True
+            )
+        ]
+        for limit in (1, 2, 3, 4, 10):
+            self.assertEqual(self.feed(limit), expected, limit)
+
+
+class RecipeCursorTest(TestCase):
+    """
+    Cursor pages of the recipe list with recipes published at the
+    same time.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            email='author@example.com', username='author'
+        )
+        start = timezone.now() - timedelta(days=1)
+        for minute in (1, 2, 2, 2, 3, 4, 4, 5):
+            with mock.patch('django.utils.timezone.now',
+                            return_value=start + timedelta(minutes=minute)):
+                Recipes.objects.create(
+                    author=author, name='recipe', text='text',
+                    cooking_time=10
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_every_recipe_once(self):
+        expected = [
+            recipe['id'] for recipe in self.page(
+                reverse('recipe-list') + '?limit=20'
+            )['results']
+        ]
+        self.assertEqual(len(expected), 8)
+        for limit in (1, 2, 3, 5):
+            pages = []
+            url = reverse('recipe-list') + f'?cursor=&limit={limit}'
+            while url:
+                data = self.page(url)
+                pages.append([recipe['id'] for recipe in data['results']])
+                last, url = url, data['next']
+            self.assertEqual(sum(pages, []), expected, limit)
+            # and back from the last page
+            url = self.page(last)['previous']
+            for ids in reversed(pages[:-1]):
+                data = self.page(url)
+                self.assertEqual(
+                    [recipe['id'] for recipe in data['results']], ids, limit
+                )
+                url = data['previous']
+            self.assertIsNone(url)
+
+    def test_delete_between_pages(self):
+        expected = [
+            recipe['id'] for recipe in self.page(
+                reverse('recipe-list') + '?limit=20'
+            )['results']
+        ]
+        first = self.page(reverse('recipe-list') + '?cursor=&limit=3')
+        second = self.page(first['next'])
+        # the page ends inside the recipes published at minute 2,
+        # the one shown last is gone before the next page is read
+        Recipes.objects.filter(pk=second['results'][-1]['id']).delete()
+        seen = [
+            recipe['id']
+            for data in (first, second, self.page(second['next']))
+            for recipe in data['results']
+        ]
+        self.assertEqual(seen, expected)
+
+
+class DocumentCacheTest(SimpleTestCase):
+    """
+    The rendered shopping lists cache stays bounded in users too.
+    """
+    def test_evicted_users_forgotten(self):
+        documents = DocumentCache(2)
+        for user_id in range(10):
+            documents.set(user_id, f'digest{user_id}', b'pdf')
+        self.assertEqual(len(documents._user_digests), 2)
+        self.assertIsNone(documents.get('digest0'))
+        self.assertEqual(documents.get('digest9'), b'pdf')
+
+    def test_shared_document(self):
+        documents = DocumentCache(2)
+        documents.set(1, 'same', b'pdf')
+        documents.set(2, 'same', b'pdf')
+        documents.set(2, 'other', b'pdf')
+        documents.invalidate_user(1)
+        self.assertIsNone(documents.get('same'))
+        self.assertEqual(documents._user_digests, {2: 'other'})
+        documents.set(3, 'third', b'pdf')
+        documents.set(4, 'fourth', b'pdf')
+        self.assertEqual(documents._user_digests, {3: 'third', 4: 'fourth'})
+
+
+class IngredientIndexTest(TestCase):
+    """
+    Ingredient autocomplete.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Фасоль', 'соль', 'Морская соль', 'Сольник', 'Свёкла',
+                     'Salt', 'sea salt'):
+            Ingredient.objects.create(name=name, measurement_unit='g')
+
+    def setUp(self):
+        cache.clear()
+        # a fresh index stands for another process, the signals of
+        # this one only reach the shared version
+        self.index = IngredientIndex(ttl=300)
+
+    def names(self, query):
+        return [item['name'] for item in self.index.search(query)]
+
+    def test_prefix_before_substring(self):
+        self.assertEqual(
+            self.names('соль'), ['соль', 'Сольник', 'Морская соль', 'Фасоль']
+        )
+        self.assertEqual(self.names('salt'), ['Salt', 'sea salt'])
+
+    def test_case_folding(self):
+        self.assertEqual(self.names('СОЛЬН'), ['Сольник'])
+        self.assertEqual(self.names('свекла'), ['Свёкла'])
+        self.assertEqual(self.names('СВЁК'), ['Свёкла'])
+        self.assertEqual(self.names('SEA'), ['sea salt'])
+
+    def test_rebuilt_on_shared_version(self):
+        self.assertEqual(self.names('перец'), [])
+        Ingredient.objects.create(name='Перец', measurement_unit='g')
+        self.assertEqual(self.names('перец'), ['Перец'])
+        # bulk writes send no signals, the index keeps its rows
+        # until the version moves
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Перец чили', measurement_unit='g')
+        ])
+        self.assertEqual(self.names('перец'), ['Перец'])
+        bump_version('ingredients')
+        self.assertEqual(self.names('перец'), ['Перец', 'Перец чили'])
+
+
+class ShoppingListDownloadTest(TestCase):
+    """
+    Shopping list downloads in every format.
+    """
+    url = reverse('recipe-download-shopping-cart')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader'
+        )
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        pinch = Ingredient.objects.create(
+            name='Соль', measurement_unit='щепотка'
+        )
+        for amounts in ((10, 1), (5, 2)):
+            recipe = Recipes.objects.create(
+                author=cls.user, name='recipe', text='text', cooking_time=10
+            )
+            for ingredient, amount in zip((salt, pinch), amounts):
+                RecipesIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                )
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format, content_type):
+        response = self.client.get(self.url, {'format': file_format})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith(content_type))
+        self.assertIn(
+            f'shopping_list.{file_format}', response['Content-Disposition']
+        )
+        if response.streaming:
+            return b''.join(response.streaming_content).decode()
+        return response.content
+
+    def test_pdf(self):
+        self.assertTrue(
+            self.download('pdf', 'application/pdf').startswith(b'%PDF')
+        )
+
+    def test_csv(self):
+        self.assertEqual(
+            self.download('csv', 'text/csv').splitlines(),
+            ['name,measurement_unit,amount', 'Соль,г,15', 'Соль,щепотка,3']
+        )
+
+    def test_txt(self):
+        self.assertEqual(
+            self.download('txt', 'text/plain').splitlines(),
+            ['Shopping list', '', '1. Соль - 15 г', '2. Соль - 3 щепотка']
+        )
+
+    def test_json(self):
+        self.assertEqual(
+            json.loads(self.download('json', 'application/json')),
+            [
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 15},
+                {'name': 'Соль', 'measurement_unit': 'щепотка', 'amount': 3},
+            ]
+        )
+
+    def test_errors_are_json(self):
+        anonymous = APIClient()
+        for file_format in ('pdf', 'csv', 'txt', 'json'):
+            response = anonymous.get(self.url, {'format': file_format})
+            self.assertEqual(response.status_code, 401, file_format)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('detail', json.loads(response.content))
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
@@ -0,0 +1,66 @@
+from django.utils.functional import cached_property
+
+from users.models import Follow
+from .models import Favorite, ShoppingCart
+
+
+class ViewerContext:
+    """
+    Relationship sets of the requesting user.
+    Every set is loaded with one query on first use and kept
+    for the rest of the request.
+    """
+    SETS = {
+        Follow: 'following_ids',
+        Favorite: 'favorite_ids',
+        ShoppingCart: 'cart_ids',
+    }
+
+    def __init__(self, user):
+        self.user = user
+
+    def _ids(self, model, field):
+        if self.user.is_anonymous:
+            return frozenset()
+        return frozenset(
+            model.objects.filter(user=self.user).order_by().values_list(
+                field, flat=True
+            )
+        )
+
+    @cached_property
+    def following_ids(self):
+        return self._ids(Follow, 'following_id')
+
+    @cached_property
+    def favorite_ids(self):
+        return self._ids(Favorite, 'recipe_id')
+
+    @cached_property
+    def cart_ids(self):
+        return self._ids(ShoppingCart, 'recipe_id')
+
+    def invalidate(self, model):
+        self.__dict__.pop(self.SETS[model], None)
+
+    def is_subscribed(self, author_id):
+        return author_id in self.following_ids
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.favorite_ids
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.cart_ids
+
+
+def get_viewer(request):
+    """
+    Viewer context of a request, shared by all serializers
+    that render it.
+    """
+    request = getattr(request, '_request', request)
+    viewer = getattr(request, 'viewer_context', None)
+    if viewer is None or viewer.user != request.user:
+        viewer = ViewerContext(request.user)
+        request.viewer_context = viewer
+    return viewer
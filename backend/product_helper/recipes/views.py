@@ -1,26 +1,38 @@
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from .autocomplete import ingredient_index
+from .batch import add_recipes, remove_recipes
+from .cache import ReferenceDataCacheMixin, RecipeValidatorsMixin
 from .filters import IngredientFilter, RecipeFilter
-from .models import (Favorite, Ingredient, Recipes, RecipesIngredient,
-                     ShoppingCart, Tag)
-from .pagination import CustomPageNumberPagination
+from .models import Favorite, Ingredient, Recipes, ShoppingCart, Tag
+from .pagination import CursorOrPageNumberPagination, FeedPagination
 from .permissions import IsAuthentificatedAuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
 from .serializers import (FavoriteSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeListSerializer,
-                          ShoppingCartSerializer, TagSerializer)
+                          RecipeBatchSerializer, RecipeCreateSerializer,
+                          RecipeListSerializer, ShoppingCartSerializer,
+                          ShoppingListItemSerializer, TagSerializer)
+from .shopping_list import (get_cached_pdf, get_shopping_list, iter_csv,
+                            iter_json, iter_txt)
+from .viewer import get_viewer
+
+SHOPPING_LIST_WRITERS = {
+    'csv': iter_csv,
+    'txt': iter_txt,
+    'json': iter_json,
+}
 
 
 class IngredientsViewSet(
+    ReferenceDataCacheMixin,
     RetrieveModelMixin,
     ListModelMixin,
     viewsets.GenericViewSet
@@ -31,11 +43,19 @@ class IngredientsViewSet(
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
+    cache_namespace = 'ingredients'
     filter_backends = [IngredientFilter, ]
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param)
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        return Response(ingredient_index.search(name))
+
 
 class TagViewSet(
+    ReferenceDataCacheMixin,
     RetrieveModelMixin,
     ListModelMixin,
     viewsets.GenericViewSet
@@ -46,10 +66,11 @@ class TagViewSet(
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    cache_namespace = 'tags'
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(RecipeValidatorsMixin, viewsets.ModelViewSet):
     """
     Complex ViewSet for recipes.
     """
@@ -57,29 +78,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthentificatedAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
-    pagination_class = CustomPageNumberPagination
+    pagination_class = CursorOrPageNumberPagination
+
+    def get_queryset(self):
+        return Recipes.objects.select_related('author')
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeListSerializer
         return RecipeCreateSerializer
 
     @staticmethod
+    @transaction.atomic
     def post_method_actions(request, pk, serializers):
         data = {'user': request.user.id, 'recipe': pk}
         serializer = serializers(data=data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        get_viewer(request).invalidate(serializers.Meta.model)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete_method_actions(request, pk, model):
         user = request.user
         recipe = get_object_or_404(Recipes, id=pk)
         model_obj = get_object_or_404(model, user=user, recipe=recipe)
         model_obj.delete()
+        get_viewer(request).invalidate(model)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    @transaction.atomic
+    def batch_actions(request, model):
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            results = add_recipes(request.user, model, recipe_ids)
+        else:
+            results = remove_recipes(request.user, model, recipe_ids)
+        get_viewer(request).invalidate(model)
+        return Response([
+            {'id': recipe_id, 'status': result}
+            for recipe_id, result in results.items()
+        ])
+
     @action(
         methods=['POST'],
         detail=True,
@@ -120,42 +164,65 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 model=ShoppingCart
             )
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_batch(self, request):
+        return self.batch_actions(request=request, model=Favorite)
+
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_batch(self, request):
+        return self.batch_actions(request=request, model=ShoppingCart)
+
     @action(
         methods=['GET'],
         detail=False,
         permission_classes=(IsAuthenticated,)
     )
-    def download_shopping_cart(self, request):
-        return_dict = {}
-        ingredients = RecipesIngredient.objects.filter(
-            recipe__carts__user=request.user).values_list(
-            'ingredient__name', 'ingredient__measurement_unit', 'amount'
-        )
-        for item in ingredients:
-            name = item[0]
-            if name not in return_dict:
-                return_dict[name] = {
-                    'measurement_unit': item[1],
-                    'amount': item[2]
-                }
-            else:
-                return_dict[name]['amount'] += item[2]
-        pdfmetrics.registerFont(
-            TTFont('Handicraft', 'data/Handicraft.ttf', 'UTF-8')
+    def feed(self, request):
+        paginator = FeedPagination()
+        recipes = paginator.paginate_feed(request.user, request)
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list(self, request):
+        serializer = ShoppingListItemSerializer(
+            get_shopping_list(request.user), many=True
         )
-        response = HttpResponse(content_type='applications/pdf')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping_list.pdf"')
-        page = canvas.Canvas(response)
-        page.setFont('Helvetica', size=30)
-        page.drawString(200, 800, 'Shopping list')
-        page.setFont('Handicraft', size=20)
-        height = 750
-        for i, (name, data) in enumerate(return_dict.items(), 1):
-            page.drawString(75, height, (f'{i}. {name} - {data["amount"]} '
-                                         f'{data["measurement_unit"]}'))
-            height -= 25
-
-        page.showPage()
-        page.save()
+        return Response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS
+    )
+    def download_shopping_cart(self, request):
+        items = get_shopping_list(request.user)
+        renderer = request.accepted_renderer
+        filename = f'shopping_list.{renderer.format}'
+        if renderer.format == 'pdf':
+            response = HttpResponse(
+                get_cached_pdf(request.user, items),
+                content_type=renderer.media_type
+            )
+        else:
+            response = StreamingHttpResponse(
+                SHOPPING_LIST_WRITERS[renderer.format](items.iterator()),
+                content_type=f'{renderer.media_type}; charset=utf-8'
+            )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
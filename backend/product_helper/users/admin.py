@@ -5,13 +5,17 @@ from .models import Follow, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name')
-    list_filter = ('username', 'email')
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
+    search_fields = ('username', 'email')
+    show_full_result_count = False
     empty_value_display = '-empty-'
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'following')
-    search_fields = ('user', 'following')
+    list_select_related = ('user', 'following')
+    search_fields = ('user__username', 'following__username')
+    autocomplete_fields = ('user', 'following')
     empty_value_display = '-empty-'
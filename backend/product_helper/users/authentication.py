@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    Size-bounded LRU map from token key to (user, token) with a
+    time to live, optionally backed by the shared Django cache.
+    Invalidation also leaves a revocation mark in the shared cache
+    for the local TTL. A local entry is checked against it at most
+    once per `check_interval` seconds, so other processes drop the
+    token within that interval without a cache round trip on every
+    hit. That takes a shared backend, with the per-process locmem
+    cache the other processes keep their entries until the local
+    TTL runs out.
+    """
+    def __init__(self, max_size, ttl, shared_ttl=None, check_interval=1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_ttl = shared_ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = 0
+
+    @staticmethod
+    def _shared_key(key):
+        return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def _revoked_key(key):
+        return 'auth:revoked:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        if entry is not None and entry[1] <= now:
+            if cache.get(self._revoked_key(key)):
+                self._drop([key])
+                entry = None
+            else:
+                self._checked(key, entry, now)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            user, token = entry[2]
+            # requests must not share one mutable user instance
+            return copy.copy(user), token
+        if self.shared_ttl:
+            credentials = cache.get(self._shared_key(key))
+            if credentials is not None:
+                self._store(key, credentials)
+                with self._lock:
+                    self.shared_hits += 1
+                return credentials
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, credentials):
+        self._store(key, credentials)
+        if self.shared_ttl:
+            cache.set(self._shared_key(key), credentials, self.shared_ttl)
+
+    def _store(self, key, credentials):
+        user, _ = credentials
+        now = time.monotonic()
+        with self._lock:
+            # (expires, next revocation check, credentials)
+            self._entries[key] = (
+                now + self.ttl, now + self.check_interval, credentials
+            )
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                old_key, (_, _, (old_user, _)) = self._entries.popitem(
+                    last=False
+                )
+                self._discard_user_key(old_user.pk, old_key)
+
+    def _checked(self, key, entry, now):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self._entries[key] = (
+                    entry[0], now + self.check_interval, entry[2]
+                )
+
+    def _discard_user_key(self, user_id, key):
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def _drop(self, keys):
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._discard_user_key(entry[2][0].pk, key)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        self._drop(keys)
+        cache.set_many(
+            {self._revoked_key(key): True for key in keys}, self.ttl
+        )
+        if self.shared_ttl:
+            cache.delete_many([self._shared_key(key) for key in keys])
+
+    def invalidate_user(self, user_id, keys=()):
+        """
+        Drop every cached token of a user. Keys of tokens cached in
+        other processes have to be passed in for the shared cache.
+        """
+        with self._lock:
+            local_keys = self._user_keys.get(user_id, set())
+        self.invalidate(set(local_keys) | set(keys))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (
+                    (self.hits + self.shared_hits) / lookups
+                    if lookups else 0.0
+                ),
+            }
+
+
+token_cache = TokenCache(
+    getattr(settings, 'TOKEN_AUTH_CACHE_SIZE', 10000),
+    getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 30),
+    getattr(settings, 'TOKEN_AUTH_SHARED_CACHE_TTL', None),
+    getattr(settings, 'TOKEN_AUTH_REVOCATION_CHECK_INTERVAL', 1)
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that skips the token and user query
+    for tokens seen recently.
+    """
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        return credentials
@@ -29,6 +29,16 @@ class User(AbstractUser):
         blank=True,
         verbose_name='last name'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='recipes'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='followers'
+    )
 
     class Meta:
         verbose_name = 'User'
@@ -57,6 +67,10 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'following'],
                                     name='unique_user_subscribers')
         ]
+        indexes = [
+            models.Index(fields=['following', 'user'],
+                         name='follow_following_user_idx')
+        ]
         verbose_name = 'Follow'
 
     def __str__(self):
@@ -1,8 +1,26 @@
 from rest_framework.pagination import PageNumberPagination
 
+from recipes.pagination import (CursorOrPageNumberPagination,
+                                CustomCursorPagination)
+
 
 class CustomPageNumberPagination(PageNumberPagination):
     """
     Pagination for users
     """
     page_size_query_param = 'limit'
+
+
+class FollowCursorPagination(CustomCursorPagination):
+    """
+    Keyset pagination for subscriptions, in the order page numbers
+    use too
+    """
+    ordering = ('id',)
+
+
+class FollowPagination(CursorOrPageNumberPagination):
+    """
+    Pagination for subscriptions, keyset mode with `?cursor=`
+    """
+    cursor_pagination_class = FollowCursorPagination
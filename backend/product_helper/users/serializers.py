@@ -4,9 +4,14 @@ from djoser.serializers import (
     TokenCreateSerializer
 )
 from django.contrib.auth.hashers import make_password
+from django.db.models import F, Manager, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
+from rest_framework.authtoken.models import Token
 
+from recipes.images import variant_urls
 from recipes.models import Recipes
+from recipes.viewer import get_viewer
 from .models import Follow, User
 
 
@@ -43,19 +48,91 @@ class CustomUserSerializer(UserSerializer):
                   'first_name', 'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if not request:
             return False
-        return Follow.objects.filter(user=user, following=obj.id).exists()
+        return get_viewer(request).is_subscribed(obj.id)
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """
     Recipe for Follow Serializer
     """
+    image_variants = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = Recipes
-        fields = ('id', 'image', 'name', 'cooking_time')
+        fields = ('id', 'image', 'image_variants', 'name', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        urls = variant_urls(obj)
+        if request:
+            return {
+                variant: request.build_absolute_uri(url)
+                for variant, url in urls.items()
+            }
+        return urls
+
+
+def get_recipes_limit(request):
+    try:
+        return int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+
+
+def latest_recipes_sql(author_ids, limit=None):
+    """
+    SQL selecting the latest recipes of every author, numbered
+    with ROW_NUMBER() over a window partitioned by author.
+    """
+    ranked = Recipes.objects.filter(author_id__in=author_ids).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )
+    ).order_by()
+    sql, params = ranked.query.sql_with_params()
+    sql = f'SELECT * FROM ({sql}) ranked'
+    if limit is not None:
+        sql += ' WHERE row_number <= %s'
+        params = (*params, limit)
+    return f'{sql} ORDER BY author_id, row_number', params
+
+
+def get_latest_recipes(author_ids, limit=None):
+    """
+    Latest recipes of every author in one query.
+    """
+    if not author_ids:
+        return {}
+    recipes = {}
+    for recipe in Recipes.objects.raw(
+        *latest_recipes_sql(author_ids, limit)
+    ):
+        recipes.setdefault(recipe.author_id, []).append(recipe)
+    return recipes
+
+
+class FollowListSerializer(serializers.ListSerializer):
+    """
+    Subscriptions page with recipe previews of all authors
+    loaded at once.
+    """
+    def to_representation(self, data):
+        authors = list(data.all() if isinstance(data, Manager) else data)
+        request = self.context.get('request')
+        recipes = get_latest_recipes(
+            [author.id for author in authors],
+            get_recipes_limit(request) if request else None
+        )
+        for author in authors:
+            author.latest_recipes = recipes.get(author.id, [])
+        return super().to_representation(authors)
 
 
 class FollowSerializer(CustomUserSerializer):
@@ -63,24 +140,26 @@ class FollowSerializer(CustomUserSerializer):
     User subscribes list serilalizer
     """
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed',
                   'recipes', 'recipes_count')
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        list_serializer_class = FollowListSerializer
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
-        return ShortRecipeSerializer(recipes, many=True).data
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
+        return ShortRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
 
 
 class PasswordSerializer(serializers.Serializer):
@@ -158,9 +237,7 @@ class CustomTokenCreateSerializer(TokenCreateSerializer):
 
     def create(self, validated_data):
         user = validated_data['user']
-        tokens = user.auth_tokens.filter(is_active=True)
-        if tokens.exists():
-            tokens.delete()
+        Token.objects.filter(user=user).delete()
 
         token = Token.objects.create(user=user)
         return {"auth_token": token.key}
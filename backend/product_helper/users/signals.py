@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .models import User
+
+
+@receiver((post_save, post_delete), sender=Token)
+def invalidate_token(sender, instance, created=False, **kwargs):
+    if not created:
+        token_cache.invalidate([instance.key])
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_tokens(sender, instance, update_fields=None,
+                           **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidate_user(
+        instance.pk,
+        Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True
+        )
+    )
@@ -0,0 +1,118 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipes
+from .authentication import TokenCache, token_cache
+from .models import Follow, User
+
+
+class SubscriptionsQueryBudgetTest(TestCase):
+    """
+    The subscriptions list takes as many queries for one author as
+    for a full page.
+    """
+    url = reverse('subscriptions') + '?limit=6&recipes_limit=3'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.authors = 0
+
+    def follow_author(self, recipes):
+        self.authors += 1
+        author = User.objects.create(
+            email=f'author{self.authors}@example.com',
+            username=f'author{self.authors}'
+        )
+        for i in range(recipes):
+            Recipes.objects.create(
+                author=author, name=f'recipe{i}', text='text',
+                cooking_time=10
+            )
+        Follow.objects.create(user=self.user, following=author)
+
+    def test_subscriptions(self):
+        self.follow_author(recipes=1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        for _ in range(5):
+            self.follow_author(recipes=5)
+        cache.clear()
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertTrue(all(
+            len(author['recipes']) == 3 and author['recipes_count'] == 5
+            for author in response.data['results'][1:]
+        ))
+
+
+class TokenCacheTest(TestCase):
+    """
+    Cached tokens stop working on the next request once revoked.
+    """
+    url = reverse('users-me')
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create(
+            email='reader@example.com', username='reader'
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, token):
+        return self.client.get(
+            self.url, HTTP_AUTHORIZATION=f'Token {token.key}'
+        ).status_code
+
+    def test_deleted_token(self):
+        self.assertEqual(self.get(self.token), 200)
+        self.token.delete()
+        self.assertEqual(self.get(self.token), 401)
+
+    def test_rotated_token(self):
+        self.assertEqual(self.get(self.token), 200)
+        self.token.delete()
+        new_token = Token.objects.create(user=self.user)
+        self.assertEqual(self.get(self.token), 401)
+        self.assertEqual(self.get(new_token), 200)
+
+    def test_deactivated_user(self):
+        self.assertEqual(self.get(self.token), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(self.token), 401)
+
+    @mock.patch('users.authentication.time.monotonic', return_value=1000.0)
+    def test_hits_skip_shared_cache(self, clock):
+        self.assertEqual(self.get(self.token), 200)
+        with mock.patch('users.authentication.cache') as shared:
+            self.assertEqual(self.get(self.token), 200)
+        shared.get.assert_not_called()
+
+    def test_revoked_in_other_process(self):
+        other = TokenCache(10, ttl=30, check_interval=1)
+        credentials = (self.user, self.token)
+        now = 1000.0
+        with mock.patch('users.authentication.time.monotonic') as clock:
+            clock.return_value = now
+            other.set(self.token.key, credentials)
+            token_cache.invalidate([self.token.key])
+            self.assertIsNotNone(other.get(self.token.key))
+            clock.return_value = now + 1
+            self.assertIsNone(other.get(self.token.key))
@@ -4,6 +4,7 @@ from djoser.views import (
     TokenCreateView, TokenDestroyView
 )
 
+from api.concurrency import async_view
 from .views import CustomUserViewSet, FollowListView
 
 router_v1 = DefaultRouter()
@@ -12,7 +13,7 @@ router_v1.register('users', CustomUserViewSet, basename='users')
 
 urlpatterns = [
     path('users/subscriptions/',
-         FollowListView.as_view(),
+         async_view(FollowListView.as_view()),
          name='subscriptions'),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
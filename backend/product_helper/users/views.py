@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import BooleanField, Value
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -6,8 +8,10 @@ from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from recipes.viewer import get_viewer
 from .models import Follow, User
-from .pagination import CustomPageNumberPagination
+from .pagination import (CustomPageNumberPagination, FollowCursorPagination,
+                         FollowPagination)
 from .serializers import (CustomUserCreateSerializer, CustomUserSerializer,
                           FollowSerializer, PasswordSerializer,
                           FollowerSerializer)
@@ -56,6 +60,7 @@ class CustomUserViewSet(UserViewSet):
         detail=True,
         permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def subscribe(self, request, id):
         user = request.user
         following = get_object_or_404(User, pk=id)
@@ -68,6 +73,7 @@ class CustomUserViewSet(UserViewSet):
         if request.method == "POST":
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
+                get_viewer(request).invalidate(Follow)
                 return Response(
                     serializer.data,
                     status=status.HTTP_201_CREATED
@@ -80,6 +86,7 @@ class CustomUserViewSet(UserViewSet):
         if request.method == "DELETE":
             if serializer.is_valid(raise_exception=False):
                 follow.delete()
+                get_viewer(request).invalidate(Follow)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 serializer.errors,
@@ -93,7 +100,9 @@ class FollowListView(ListAPIView):
     """
     serializer_class = FollowSerializer
     permission_classes = [IsAuthenticated, ]
-    pagination_class = CustomPageNumberPagination
+    pagination_class = FollowPagination
 
     def get_queryset(self):
-        return User.objects.filter(author__user=self.request.user)
+        return User.objects.filter(author__user=self.request.user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by(*FollowCursorPagination.ordering)